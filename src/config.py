@@ -3,6 +3,21 @@ ADMIN_PASSWORD = "your password"
 ADMIN_ID = []
 
 DB_NAME = "users_id"
+DB_POOL_SIZE = 5  # Максимальное число соединений с базой в пуле
+
+# Настройки хранилища SQLite (применяются к каждому соединению)
+DB_PRAGMAS = {
+    'busy_timeout': 5000,  # мс ожидания блокировки перед ошибкой
+    'journal_mode': 'WAL',  # чтение не блокирует запись
+    'synchronous': 'NORMAL',
+    'cache_size': -8000,  # отрицательное значение - размер в КиБ
+    'mmap_size': 64 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+DB_CHECKPOINT_INTERVAL = 300  # Секунд между принудительными checkpoint журнала WAL
+DB_BUSY_RETRIES = 5  # Сколько раз повторять запись при "database is locked"
+DB_BUSY_BACKOFF = 0.05  # Начальная пауза между повторами (удваивается), секунд
+DB_CACHED_STATEMENTS = 256  # Подготовленных выражений в кэше каждого соединения
 
 # Настройки расписания
 WORKING_HOURS_WEEKDAY = [
@@ -17,5 +32,72 @@ WORKING_HOURS_WEEKEND = [
     ]
 WORKING_HOURS_SUNDAY = []  # Воскресенье - выходной
 
+# Недельный шаблон расписания: день недели (0 - понедельник) -> рабочие слоты.
+# Отклонения от шаблона (закрытые или дополнительные слоты) хранятся в таблице schedule_exceptions
+WEEKLY_SCHEDULE = {
+    0: WORKING_HOURS_WEEKDAY,
+    1: WORKING_HOURS_WEEKDAY,
+    2: WORKING_HOURS_WEEKDAY,
+    3: [],  # Четверг - выходной
+    4: [],  # Пятница - выходной
+    5: [],  # Суббота - выходной
+    6: WORKING_HOURS_WEEKEND,
+}
+BOOKING_BUFFER_MINUTES = 30  # Не раньше чем через сколько минут можно записаться на сегодня
+
+# Кэш свободного времени
+AVAILABILITY_CACHE_SIZE = 512  # Максимум записей (дата, длительность)
+AVAILABILITY_CACHE_TTL = 300  # Время жизни записи, секунд
+
+# Каталог услуг в памяти
+CATALOG_CHECK_INTERVAL = 60  # Как часто сверять версию каталога с базой, секунд
+
+# Хранилище состояний FSM
+FSM_STATE_TTL = 24 * 3600  # Через сколько секунд без действий сессия считается брошенной
+FSM_CLEANUP_INTERVAL = 3600  # Как часто удалять брошенные сессии из базы, секунд
+FSM_CACHE_SIZE = 1000  # Сколько сессий держать в памяти процесса
+FSM_CACHE_CHECK_INTERVAL = 5  # Сколько секунд доверять копии сессии в памяти без сверки с базой
+
+# Защита от повторной доставки обновлений (Telegram и платформа повторяют медленные запросы)
+UPDATE_DEDUP_CACHE_SIZE = 10000  # Сколько последних update_id помнить в памяти
+UPDATE_DEDUP_TTL = 24 * 3600  # Сколько секунд хранить update_id в базе
+UPDATE_DEDUP_CLEANUP_INTERVAL = 3600  # Как часто чистить журнал обновлений, секунд
+
+# Обработка обновлений
+UPDATE_MAX_CONCURRENCY = 16  # Сколько чатов обрабатывается одновременно (обновления одного чата - по очереди)
+
+# Вебхук-сервер
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8080
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = "your_webhook_secret"  # Секретный токен (A-Z, a-z, 0-9, _ и -), Telegram присылает его в заголовке
+WEBHOOK_MAX_CONNECTIONS = 40  # Сколько одновременных запросов Telegram может открыть к серверу
+WEBHOOK_QUEUE_SIZE = 1000  # Максимум принятых, но еще не обработанных обновлений (делится между обработчиками)
+WEBHOOK_WORKERS = 8  # Сколько обновлений обрабатывается одновременно (чат закреплен за одним обработчиком)
+WEBHOOK_ENQUEUE_TIMEOUT = 1.0  # Сколько ждать места в очереди перед ответом 503, секунд
+WEBHOOK_DRAIN_TIMEOUT = 30  # Сколько дорабатывать очередь при остановке, секунд
+
+# Админ-панель
+ADMIN_CHECK_INTERVAL = 30  # Как часто сверять версию списка администраторов с базой, секунд
+ADMIN_PAGE_SIZE = 5  # Сколько записей показывать на одной странице списка
+ADMIN_SEARCH_LIMIT = 15  # Сколько найденных записей показывать по /search
+
+# Кэш клавиатур
+KEYBOARD_CACHE_SIZE = 256  # Максимум закэшированных вариантов для каждой клавиатуры с параметрами
+
 # Настройки уведомлений
 REMINDER_HOURS_BEFORE = 2  # За сколько часов напоминать о записи
+REMINDERS_PER_INVOCATION = 100  # Сколько напоминаний отправлять за один вызов serverless-функции по таймеру
+
+# Лимиты исходящих сообщений (Telegram: ~30 сообщений в секунду, ~1 в секунду на чат)
+SEND_RATE_PER_SECOND = 25  # Общий лимит сообщений в секунду
+SEND_BURST = 5  # Сколько сообщений можно отправить всплеском сверх среднего темпа
+SEND_PER_CHAT_INTERVAL = 1.0  # Минимальный интервал между сообщениями в один чат, секунд
+SEND_MAX_CONCURRENCY = 10  # Одновременных запросов к Telegram
+SEND_MAX_RETRIES = 3  # Повторов после RetryAfter
+
+# Рассылки клиентам
+BROADCAST_CHUNK_SIZE = 100  # Сколько получателей читать из базы за раз
+BROADCAST_PROGRESS_INTERVAL = 3  # Как часто обновлять сообщение с ходом рассылки, секунд
+BROADCAST_CHUNKS_PER_INVOCATION = 2  # Сколько порций рассылки отправлять за один вызов serverless-функции по таймеру
+BROADCAST_CLAIM_TIMEOUT = 600  # Через сколько секунд неподтвержденная доставка считается прерванной
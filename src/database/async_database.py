@@ -0,0 +1,107 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from database import database
+from utils import schedule_utils
+
+# Отдельный пул потоков для запросов к базе: по одному потоку на соединение
+executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix='db')
+
+async def run_in_db(func, *args, **kwargs):
+    """Выполнить синхронную функцию работы с базой, не блокируя цикл событий"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+def _to_async(func):
+    """Обернуть синхронную функцию в корутину, выполняемую в пуле потоков базы"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db(func, *args, **kwargs)
+    return wrapper
+
+# Пользователи
+save_user = _to_async(database.save_user)
+get_user = _to_async(database.get_user)
+
+# Услуги
+get_services = _to_async(database.get_services)
+get_service_by_id = _to_async(database.get_service_by_id)
+
+# Записи
+create_booking = _to_async(database.create_booking)
+get_booking_id_by_idempotency_key = _to_async(database.get_booking_id_by_idempotency_key)
+get_user_bookings = _to_async(database.get_user_bookings)
+update_booking_status = _to_async(database.update_booking_status)
+get_booking_by_id = _to_async(database.get_booking_by_id)
+get_booking_with_client_info = _to_async(database.get_booking_with_client_info)
+get_pending_bookings = _to_async(database.get_pending_bookings)
+get_today_bookings = _to_async(database.get_today_bookings)
+get_tomorrow_bookings = _to_async(database.get_tomorrow_bookings)
+get_week_bookings = _to_async(database.get_week_bookings)
+get_all_bookings = _to_async(database.get_all_bookings)
+get_bookings_page = _to_async(database.get_bookings_page)
+search_bookings = _to_async(database.search_bookings)
+get_bookings_by_date = _to_async(database.get_bookings_by_date)
+get_bookings_by_user_id = _to_async(database.get_bookings_by_user_id)
+get_bookings_by_status = _to_async(database.get_bookings_by_status)
+get_recent_bookings = _to_async(database.get_recent_bookings)
+count_bookings_by_status = _to_async(database.count_bookings_by_status)
+
+# Журнал обработанных обновлений
+claim_update = _to_async(database.claim_update)
+release_update = _to_async(database.release_update)
+delete_expired_updates = _to_async(database.delete_expired_updates)
+
+# Состояния FSM
+load_fsm_record = _to_async(database.load_fsm_record)
+save_fsm_field = _to_async(database.save_fsm_field)
+delete_expired_fsm_records = _to_async(database.delete_expired_fsm_records)
+
+# Администраторы
+add_admin = _to_async(database.add_admin)
+load_admins = _to_async(database.load_admins)
+get_all_admins = _to_async(database.get_all_admins)
+
+async def is_admin(user_id: int) -> bool:
+    """Проверить администратора по набору в памяти (без запроса к базе и пула потоков)"""
+    return database.is_admin(user_id)
+
+async def refresh_admins():
+    """Сверить список администраторов с базой, если пора (не чаще ADMIN_CHECK_INTERVAL)"""
+    if database.admins_check_due():
+        await run_in_db(database.refresh_admins)
+
+# Статистика и уведомления
+get_statistics = _to_async(database.get_statistics)
+verify_statistics = _to_async(database.verify_statistics)
+rebuild_statistics = _to_async(database.rebuild_statistics)
+verify_booking_indexes = _to_async(database.verify_booking_indexes)
+get_daily_statistics = _to_async(database.get_daily_statistics)
+get_daily_rollups = _to_async(database.get_daily_rollups)
+get_period_report = _to_async(database.get_period_report)
+get_pending_bookings_count = _to_async(database.get_pending_bookings_count)
+get_today_bookings_count = _to_async(database.get_today_bookings_count)
+get_clients_for_notification = _to_async(database.get_clients_for_notification)
+
+# Рассылки
+create_broadcast_job = _to_async(database.create_broadcast_job)
+get_broadcast_job = _to_async(database.get_broadcast_job)
+get_running_broadcast_jobs = _to_async(database.get_running_broadcast_jobs)
+set_broadcast_progress_message = _to_async(database.set_broadcast_progress_message)
+claim_broadcast_chunk = _to_async(database.claim_broadcast_chunk)
+record_broadcast_results = _to_async(database.record_broadcast_results)
+abandon_claimed_deliveries = _to_async(database.abandon_claimed_deliveries)
+finish_broadcast_job = _to_async(database.finish_broadcast_job)
+
+# Напоминания
+get_next_reminder_time = _to_async(database.get_next_reminder_time)
+claim_due_reminders = _to_async(database.claim_due_reminders)
+
+# Расписание
+get_available_time_slots = _to_async(schedule_utils.get_available_time_slots)
+get_available_dates_with_slots = _to_async(schedule_utils.get_available_dates_with_slots)
+get_available_slots_by_date = _to_async(schedule_utils.get_available_slots_by_date)
+is_slot_available = _to_async(schedule_utils.is_slot_available)
+set_slot_availability = _to_async(schedule_utils.set_slot_availability)
@@ -0,0 +1,149 @@
+import functools
+import sqlite3
+from typing import List, Optional, Sequence, Tuple
+
+# Столбцы для выборки: имя в результате -> выражение SQL
+COLUMNS = {
+    'booking_id': 'b.booking_id',
+    'user_id': 'b.user_id',
+    'service_id': 'b.service_id',
+    'booking_datetime': 'b.booking_datetime',
+    'status': 'b.status',
+    'notes': 'b.notes',
+    'created_at': 'b.created_at',
+    'idempotency_key': 'b.idempotency_key',
+    'first_name': 'u.first_name',
+    'last_name': 'u.last_name',
+    'username': 'u.username',
+    'phone': 'u.phone',
+    'registration_date': 'u.registration_date',
+    'service_name': 's.name AS service_name',
+    'price': 's.price',
+    'duration_minutes': 's.duration_minutes',
+    'service_description': 's.description AS service_description',
+}
+
+# Все столбцы таблицы bookings (аналог b.*)
+BOOKING_COLUMNS = (
+    'booking_id', 'user_id', 'service_id', 'booking_datetime',
+    'status', 'notes', 'created_at', 'idempotency_key',
+)
+
+# Столбцы карточки записи в списках администратора
+LIST_COLUMNS = (
+    'booking_id', 'user_id', 'first_name', 'username', 'service_name',
+    'booking_datetime', 'status', 'price', 'duration_minutes',
+)
+
+# Таблицы, которые присоединяются, только если нужны их столбцы
+JOINS = {
+    'u.': ' JOIN users u ON b.user_id = u.user_id',
+    's.': ' JOIN services s ON b.service_id = s.service_id',
+}
+
+# Условия отбора в фиксированном порядке: одинаковый набор фильтров дает один текст SQL
+FILTERS = {
+    'booking_id': 'b.booking_id = ?',
+    'user_id': 'b.user_id = ?',
+    'status': 'b.status = ?',
+    'period': 'b.booking_datetime >= ? AND b.booking_datetime < ?',
+    'after': '(b.booking_datetime, b.booking_id) > (?, ?)',
+    'before': '(b.booking_datetime, b.booking_id) < (?, ?)',
+}
+
+# Порядок сортировки (booking_id делает порядок однозначным для курсоров)
+ORDERS = {
+    'datetime': 'b.booking_datetime ASC, b.booking_id ASC',
+    'datetime_desc': 'b.booking_datetime DESC, b.booking_id DESC',
+    'created_desc': 'b.created_at DESC, b.booking_id DESC',
+}
+
+@functools.lru_cache(maxsize=128)
+def _compile(columns: Tuple[str, ...], filters: Tuple[str, ...], order: str, limited: bool) -> str:
+    """Текст SQL для формы запроса (столбцы, фильтры, сортировка, наличие лимита)"""
+    expressions = [COLUMNS[column] for column in columns]
+    select = ', '.join(expressions)
+    joins = ''.join(
+        join for prefix, join in JOINS.items()
+        if any(expression.startswith(prefix) for expression in expressions)
+    )
+    where = ' WHERE ' + ' AND '.join(FILTERS[name] for name in filters) if filters else ''
+    limit = ' LIMIT ?' if limited else ''
+    return f'SELECT {select} FROM bookings b{joins}{where} ORDER BY {ORDERS[order]}{limit}'
+
+class BookingQuery:
+    """Запрос к записям вместе с клиентом и услугой.
+
+    Фильтры, сортировка, набор столбцов и лимит собираются в параметризованный SQL.
+    Значения всегда передаются параметрами, а условия идут в фиксированном порядке,
+    поэтому запросы одной формы дают один и тот же текст и используют уже
+    подготовленное выражение из кэша соединения (cached_statements).
+    Users и services присоединяются, только если выбраны их столбцы.
+    """
+
+    def __init__(self, columns: Sequence[str] = LIST_COLUMNS):
+        unknown = [column for column in columns if column not in COLUMNS]
+        if unknown:
+            raise ValueError(f"Неизвестные столбцы записи: {', '.join(unknown)}")
+        self.columns = tuple(columns)
+        self._filters = {}
+        self._order = 'datetime'
+        self._limit: Optional[int] = None
+
+    def booking(self, booking_id: int) -> 'BookingQuery':
+        """Только запись с указанным ID"""
+        self._filters['booking_id'] = (booking_id,)
+        return self
+
+    def user(self, user_id: int) -> 'BookingQuery':
+        """Только записи клиента"""
+        self._filters['user_id'] = (user_id,)
+        return self
+
+    def status(self, status: str) -> 'BookingQuery':
+        """Только записи с указанным статусом"""
+        self._filters['status'] = (status,)
+        return self
+
+    def period(self, start: str, end: str) -> 'BookingQuery':
+        """Только записи со временем в [start, end) (границы из day_range)"""
+        self._filters['period'] = (start, end)
+        return self
+
+    def after(self, cursor: Tuple[str, int]) -> 'BookingQuery':
+        """Записи после курсора (booking_datetime, booking_id)"""
+        self._filters['after'] = tuple(cursor)
+        return self
+
+    def before(self, cursor: Tuple[str, int]) -> 'BookingQuery':
+        """Записи до курсора (booking_datetime, booking_id)"""
+        self._filters['before'] = tuple(cursor)
+        return self
+
+    def order_by(self, order: str) -> 'BookingQuery':
+        """Сортировка из ORDERS"""
+        if order not in ORDERS:
+            raise ValueError(f"Неизвестная сортировка записей: {order}")
+        self._order = order
+        return self
+
+    def limit(self, limit: int) -> 'BookingQuery':
+        """Ограничить количество записей"""
+        self._limit = limit
+        return self
+
+    def build(self) -> Tuple[str, tuple]:
+        """Текст SQL и параметры запроса"""
+        names = tuple(name for name in FILTERS if name in self._filters)
+        params = tuple(value for name in names for value in self._filters[name])
+        if self._limit is not None:
+            params += (self._limit,)
+        return _compile(self.columns, names, self._order, self._limit is not None), params
+
+    def fetchall(self, conn: sqlite3.Connection) -> List[sqlite3.Row]:
+        """Выполнить запрос и вернуть все записи"""
+        return conn.execute(*self.build()).fetchall()
+
+    def fetchone(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        """Выполнить запрос и вернуть первую запись"""
+        return conn.execute(*self.build()).fetchone()
@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, ContextManager, Dict, List, Optional
+
+class ServiceCatalog:
+    """Каталог услуг в памяти процесса.
+
+    Услуги перечитываются из базы, только если изменилась версия таблицы services
+    (ее увеличивают триггеры). Версия проверяется не чаще раза в check_interval секунд.
+    """
+
+    def __init__(self, connection_factory: Callable[[], ContextManager[sqlite3.Connection]],
+                 check_interval: float = 60):
+        self._connection_factory = connection_factory
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self._services: List[sqlite3.Row] = []
+        self._by_id: Dict[int, sqlite3.Row] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Перечитать услуги, если версия каталога изменилась"""
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+
+        with self._lock:
+            if self.version is not None and now - self._checked_at < self.check_interval:
+                return
+
+            with self._connection_factory() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT version FROM table_versions WHERE table_name = 'services'")
+                row = cursor.fetchone()
+                version = row[0] if row else 0
+
+                if version != self.version:
+                    cursor.execute('SELECT * FROM services ORDER BY price')
+                    services = cursor.fetchall()
+                    self._services = services
+                    self._by_id = {service['service_id']: service for service in services}
+                    self.version = version
+
+            self._checked_at = now
+
+    def invalidate(self):
+        """Проверить версию каталога при следующем обращении"""
+        self._checked_at = 0.0
+
+    def get_all(self) -> List[sqlite3.Row]:
+        """Все услуги, отсортированные по цене"""
+        self._refresh()
+        return list(self._services)
+
+    def get(self, service_id: int) -> Optional[sqlite3.Row]:
+        """Услуга по ID"""
+        self._refresh()
+        return self._by_id.get(service_id)
@@ -1,692 +1,1580 @@
 import sqlite3
 import datetime
-from typing import List, Tuple, Optional
-
-def get_db_connection(db_name: str = 'users_id') -> sqlite3.Connection:
-    """Создать соединение с базой данных"""
-    conn = sqlite3.connect(db_name)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    """Инициализация базы данных"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Таблица пользователей
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            phone TEXT,
-            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+import re
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from database.booking_query import BOOKING_COLUMNS, LIST_COLUMNS, BookingQuery
+from database.catalog import ServiceCatalog
+from database.pool import ConnectionPool
+from utils.availability_cache import availability_cache
+from utils.slot_bitmap import SLOT_MINUTES, slots_needed, time_to_minutes
+
+pool = ConnectionPool(
+    config.DB_NAME,
+    size=config.DB_POOL_SIZE,
+    pragmas=config.DB_PRAGMAS,
+    checkpoint_interval=config.DB_CHECKPOINT_INTERVAL,
+    busy_retries=config.DB_BUSY_RETRIES,
+    busy_backoff=config.DB_BUSY_BACKOFF,
+    cached_statements=config.DB_CACHED_STATEMENTS
+)
+
+# Статусы записей, которые занимают время в расписании
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+# Пересчет счетчиков статистики с нуля (миграции 14, 15 и rebuild_statistics).
+# Выручка считается по цене, сохраненной в записи, поэтому изменение цены услуги
+# не расходится со счетчиками
+STATS_TOTALS_REBUILD_SQL = [
+    'DELETE FROM stats_status',
+    'DELETE FROM stats_daily',
+    'DELETE FROM stats_clients',
+    'DELETE FROM stats_counters',
+    '''
+    INSERT INTO stats_status (status, bookings, revenue)
+    SELECT status, COUNT(*), COALESCE(SUM(price), 0) FROM bookings GROUP BY status
+    ''',
+    '''
+    INSERT INTO stats_daily (day, status, bookings, revenue)
+    SELECT substr(booking_datetime, 1, 10), status, COUNT(*), COALESCE(SUM(price), 0)
+    FROM bookings
+    GROUP BY substr(booking_datetime, 1, 10), status
+    ''',
+    'INSERT INTO stats_clients (user_id, bookings) SELECT user_id, COUNT(*) FROM bookings GROUP BY user_id',
+    "INSERT INTO stats_counters (name, value) SELECT 'clients', COUNT(*) FROM stats_clients",
+    "INSERT INTO stats_counters (name, value) SELECT 'users', COUNT(*) FROM users",
+]
+
+# Счетчики по дням для отчетов: услуги (выручка - подтвержденные записи) и клиенты дня
+STATS_DAYS_REBUILD_SQL = [
+    'DELETE FROM stats_daily_services',
+    'DELETE FROM stats_daily_clients',
+    '''
+    INSERT INTO stats_daily_services (day, service_id, bookings, confirmed, revenue)
+    SELECT substr(booking_datetime, 1, 10), service_id, COUNT(*), SUM(status = 'confirmed'),
+           COALESCE(SUM(CASE WHEN status = 'confirmed' THEN price END), 0)
+    FROM bookings
+    GROUP BY substr(booking_datetime, 1, 10), service_id
+    ''',
+    '''
+    INSERT INTO stats_daily_clients (day, user_id, bookings)
+    SELECT substr(booking_datetime, 1, 10), user_id, COUNT(*)
+    FROM bookings
+    GROUP BY substr(booking_datetime, 1, 10), user_id
+    ''',
+]
+
+STATS_REBUILD_SQL = STATS_TOTALS_REBUILD_SQL + STATS_DAYS_REBUILD_SQL
+
+# Тело триггера: учесть запись NEW в счетчиках (по цене из записи)
+_STATS_ADD_NEW = '''
+    INSERT INTO stats_status (status, bookings, revenue)
+    VALUES (NEW.status, 1, COALESCE(NEW.price, 0))
+    ON CONFLICT (status) DO UPDATE SET
+        bookings = bookings + 1, revenue = revenue + excluded.revenue;
+    INSERT INTO stats_daily (day, status, bookings, revenue)
+    VALUES (substr(NEW.booking_datetime, 1, 10), NEW.status, 1, COALESCE(NEW.price, 0))
+    ON CONFLICT (day, status) DO UPDATE SET
+        bookings = bookings + 1, revenue = revenue + excluded.revenue;
+    INSERT INTO stats_clients (user_id, bookings) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET bookings = bookings + 1;
+    UPDATE stats_counters SET value = value + 1
+    WHERE name = 'clients' AND (SELECT bookings FROM stats_clients WHERE user_id = NEW.user_id) = 1;
+'''
+
+# Тело триггера: убрать запись OLD из счетчиков (по той же цене, что была учтена)
+_STATS_REMOVE_OLD = '''
+    UPDATE stats_status SET bookings = bookings - 1, revenue = revenue - COALESCE(OLD.price, 0)
+    WHERE status = OLD.status;
+    UPDATE stats_daily SET bookings = bookings - 1, revenue = revenue - COALESCE(OLD.price, 0)
+    WHERE day = substr(OLD.booking_datetime, 1, 10) AND status = OLD.status;
+    UPDATE stats_clients SET bookings = bookings - 1 WHERE user_id = OLD.user_id;
+    UPDATE stats_counters SET value = value - 1
+    WHERE name = 'clients' AND (SELECT bookings FROM stats_clients WHERE user_id = OLD.user_id) = 0;
+    DELETE FROM stats_clients WHERE user_id = OLD.user_id AND bookings = 0;
+'''
+
+# Тело триггера: учесть запись NEW в счетчиках дня по услугам и клиентам
+_DAY_STATS_ADD_NEW = '''
+    INSERT INTO stats_daily_services (day, service_id, bookings, confirmed, revenue)
+    VALUES (substr(NEW.booking_datetime, 1, 10), NEW.service_id, 1, NEW.status = 'confirmed',
+            CASE WHEN NEW.status = 'confirmed' THEN COALESCE(NEW.price, 0) ELSE 0 END)
+    ON CONFLICT (day, service_id) DO UPDATE SET
+        bookings = bookings + 1,
+        confirmed = confirmed + excluded.confirmed,
+        revenue = revenue + excluded.revenue;
+    INSERT INTO stats_daily_clients (day, user_id, bookings)
+    VALUES (substr(NEW.booking_datetime, 1, 10), NEW.user_id, 1)
+    ON CONFLICT (day, user_id) DO UPDATE SET bookings = bookings + 1;
+'''
+
+# Тело триггера: убрать запись OLD из счетчиков дня (пустые строки удаляются)
+_DAY_STATS_REMOVE_OLD = '''
+    UPDATE stats_daily_services SET
+        bookings = bookings - 1,
+        confirmed = confirmed - (OLD.status = 'confirmed'),
+        revenue = revenue - CASE WHEN OLD.status = 'confirmed' THEN COALESCE(OLD.price, 0) ELSE 0 END
+    WHERE day = substr(OLD.booking_datetime, 1, 10) AND service_id = OLD.service_id;
+    DELETE FROM stats_daily_services
+    WHERE day = substr(OLD.booking_datetime, 1, 10) AND service_id = OLD.service_id AND bookings = 0;
+    UPDATE stats_daily_clients SET bookings = bookings - 1
+    WHERE day = substr(OLD.booking_datetime, 1, 10) AND user_id = OLD.user_id;
+    DELETE FROM stats_daily_clients
+    WHERE day = substr(OLD.booking_datetime, 1, 10) AND user_id = OLD.user_id AND bookings = 0;
+'''
+
+# Миграции схемы: номер миграции = позиция в списке + 1 (хранится в PRAGMA user_version)
+MIGRATIONS = [
+    # 1: индексы для поиска записей по диапазону дат без полного просмотра таблицы
+    [
+        'CREATE INDEX IF NOT EXISTS idx_bookings_datetime ON bookings (booking_datetime)',
+        'CREATE INDEX IF NOT EXISTS idx_bookings_status_datetime ON bookings (status, booking_datetime)',
+        'CREATE INDEX IF NOT EXISTS idx_bookings_user_datetime ON bookings (user_id, booking_datetime)',
+    ],
+    # 2: версии таблиц для кэшей в памяти (каталог услуг)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
         )
-    ''')
-
-    # Таблица услуг
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS services (
-            service_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            price DECIMAL(10, 2) NOT NULL,
-            duration_minutes INTEGER NOT NULL,
-            description TEXT
+        ''',
+        "INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('services', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS services_version_insert AFTER INSERT ON services
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = 'services';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS services_version_update AFTER UPDATE ON services
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = 'services';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS services_version_delete AFTER DELETE ON services
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = 'services';
+        END
+        ''',
+    ],
+    # 3: напоминания о записях (sent_at - журнал отправки)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS reminders (
+            booking_id INTEGER PRIMARY KEY,
+            remind_at DATETIME NOT NULL,
+            sent_at TIMESTAMP,
+            FOREIGN KEY (booking_id) REFERENCES bookings (booking_id)
         )
-    ''')
-
-    # Таблица записей
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings(
-            booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            service_id INTEGER NOT NULL,
-            booking_datetime DATETIME NOT NULL,
-            status TEXT DEFAULT 'pending',
-            notes TEXT,
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders (remind_at) WHERE sent_at IS NULL',
+        f'''
+        INSERT OR IGNORE INTO reminders (booking_id, remind_at)
+        SELECT booking_id, datetime(booking_datetime, '-{config.REMINDER_HOURS_BEFORE} hours')
+        FROM bookings
+        WHERE status = 'confirmed' AND booking_datetime > datetime('now', 'localtime')
+        ''',
+    ],
+    # 4: рассылки клиентам (задание с курсором по user_id и журнал доставки)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            audience TEXT NOT NULL,
+            audience_date TEXT,
+            text TEXT NOT NULL,
+            status TEXT DEFAULT 'running',
+            last_user_id INTEGER DEFAULT 0,
+            total_count INTEGER DEFAULT 0,
+            sent_count INTEGER DEFAULT 0,
+            failed_count INTEGER DEFAULT 0,
+            admin_chat_id INTEGER,
+            progress_message_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            FOREIGN KEY (service_id) REFERENCES services (service_id)
-        )          
-    ''')
-
-    # Таблица расписания
-    cursor.execute('''
+            finished_at TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            job_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'claimed',
+            PRIMARY KEY (job_id, user_id),
+            FOREIGN KEY (job_id) REFERENCES broadcast_jobs (job_id)
+        )
+        ''',
+    ],
+    # 5: расписание по недельному шаблону - в базе только отклонения от него
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS schedule_exceptions (
+            exception_date DATE NOT NULL,
+            slot_time TIME NOT NULL,
+            is_available BOOLEAN NOT NULL,
+            PRIMARY KEY (exception_date, slot_time)
+        )
+        ''',
+        # Старая таблица слотов есть только в базах до этой миграции; в новой базе
+        # создается пустой, чтобы перенос ниже не упал, и сразу удаляется
+        '''
         CREATE TABLE IF NOT EXISTS schedule_slots (
-            slot_id INTEGER PRIMARY KEY AUTOINCREMENT,
             slot_date DATE NOT NULL,
             slot_time TIME NOT NULL,
-            is_available BOOLEAN DEFAULT 1,
-            booking_id INTEGER,
-            UNIQUE(slot_date, slot_time)
+            is_available BOOLEAN DEFAULT 1
         )
-    ''')
-
-    # Таблица администраторов
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admins (
+        ''',
+        '''
+        INSERT OR IGNORE INTO schedule_exceptions (exception_date, slot_time, is_available)
+        SELECT slot_date, slot_time, 0 FROM schedule_slots WHERE is_available = 0
+        ''',
+        'DROP TABLE IF EXISTS schedule_slots',
+    ],
+    # 6: состояния FSM (переживают перезапуск и смену контейнера в serverless)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            storage_key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated ON fsm_storage (updated_at)',
+    ],
+    # 7: защита от повторной обработки (журнал обновлений и ключи идемпотентности записей)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS processed_updates (
+            update_id INTEGER PRIMARY KEY,
+            processed_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_processed_updates_at ON processed_updates (processed_at)',
+        'ALTER TABLE bookings ADD COLUMN idempotency_key TEXT',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency
+        ON bookings (idempotency_key) WHERE idempotency_key IS NOT NULL
+        ''',
+    ],
+    # 8: полнотекстовый индекс (триграммы) для поиска записей по клиенту и услуге
+    [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts
+        USING fts5(first_name, username, service_name, tokenize = 'trigram')
+        ''',
+        '''
+        INSERT INTO bookings_fts (rowid, first_name, username, service_name)
+        SELECT b.booking_id, u.first_name, u.username, s.name
+        FROM bookings b
+        LEFT JOIN users u ON b.user_id = u.user_id
+        LEFT JOIN services s ON b.service_id = s.service_id
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_insert AFTER INSERT ON bookings
+        BEGIN
+            INSERT INTO bookings_fts (rowid, first_name, username, service_name) VALUES (
+                NEW.booking_id,
+                (SELECT first_name FROM users WHERE user_id = NEW.user_id),
+                (SELECT username FROM users WHERE user_id = NEW.user_id),
+                (SELECT name FROM services WHERE service_id = NEW.service_id)
+            );
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_update AFTER UPDATE OF user_id, service_id ON bookings
+        BEGIN
+            UPDATE bookings_fts SET
+                first_name = (SELECT first_name FROM users WHERE user_id = NEW.user_id),
+                username = (SELECT username FROM users WHERE user_id = NEW.user_id),
+                service_name = (SELECT name FROM services WHERE service_id = NEW.service_id)
+            WHERE rowid = NEW.booking_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_delete AFTER DELETE ON bookings
+        BEGIN
+            DELETE FROM bookings_fts WHERE rowid = OLD.booking_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users
+        BEGIN
+            UPDATE bookings_fts SET first_name = NEW.first_name, username = NEW.username
+            WHERE rowid IN (SELECT booking_id FROM bookings WHERE user_id = NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF first_name, username ON users
+        WHEN OLD.first_name IS NOT NEW.first_name OR OLD.username IS NOT NEW.username
+        BEGIN
+            UPDATE bookings_fts SET first_name = NEW.first_name, username = NEW.username
+            WHERE rowid IN (SELECT booking_id FROM bookings WHERE user_id = NEW.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS services_fts_update AFTER UPDATE OF name ON services
+        WHEN OLD.name IS NOT NEW.name
+        BEGIN
+            UPDATE bookings_fts SET service_name = NEW.name
+            WHERE rowid IN (SELECT booking_id FROM bookings WHERE service_id = NEW.service_id);
+        END
+        ''',
+    ],
+    # 9: счетчики статистики, которые поддерживают триггеры
+    # (триггеры записей и заполнение - в миграции 14, когда у записи появилась цена)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS stats_status (
+            status TEXT PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_clients (
             user_id INTEGER PRIMARY KEY,
-            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            bookings INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
         )
-    ''')
-
-    # Заполняем услуги
-    default_services = [
-        (1, 'Дизайн ногтей', 150, 15, 'Создание уникального дизайна'),
-        (2, 'Комбинированный маникюр', 1500, 45, 'Комбинированная обработка кутикулы'),
-        (3, 'Мужской маникюр', 2000, 60, 'Уход за мужскими руками'),
-        (4, 'Маникюр с покрытием гель-лаком', 5000, 120, 'Маникюр с гель-лаком'),
-        (5, 'Наращивание ногтей', 7500, 240, 'Удлинение ногтевой пластины'),
-        (6, 'Японский маникюр', 2500, 60, 'Японская технология ухода'),
-        (7, 'Педикюр с покрытием гель-лаком', 5000, 120, 'Уход за стопами'),
-        (8, 'Снятие гель-лака', 1000, 30, 'Аккуратное снятие покрытия'),
-        (9, 'Обработка сложного участка', 1500, 20, 'Решение проблемных зон'),
-        (10, 'Маникюр с покрытием гелем', 4000, 120, 'Укрепление гелем')
-    ]
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_users_insert AFTER INSERT ON users
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'users';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_users_delete AFTER DELETE ON users
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'users';
+        END
+        ''',
+    ],
+    # 10: дневные сводки (таблица daily_rollups заменена счетчиками по дням в миграции 15)
+    [],
+    # 11: метка версии сессии FSM, чтобы копию в памяти процесса можно было сверить с базой
+    [
+        'ALTER TABLE fsm_storage ADD COLUMN revision TEXT',
+    ],
+    # 12: время захвата получателя рассылки, чтобы отличать прерванные доставки от идущих
+    [
+        'ALTER TABLE broadcast_deliveries ADD COLUMN claimed_at REAL',
+    ],
+    # 13: версия списка администраторов, чтобы другие процессы увидели изменения
+    [
+        "INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('admins', 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS admins_version_insert AFTER INSERT ON admins
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = 'admins';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS admins_version_delete AFTER DELETE ON admins
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = 'admins';
+        END
+        ''',
+    ],
+    # 14: цена в записи на момент оформления - выручка в счетчиках не зависит от смены цен услуг
+    [
+        'ALTER TABLE bookings ADD COLUMN price DECIMAL(10, 2)',
+        'UPDATE bookings SET price = (SELECT price FROM services WHERE service_id = bookings.service_id)',
+        'DROP TRIGGER IF EXISTS stats_bookings_insert',
+        'DROP TRIGGER IF EXISTS stats_bookings_update',
+        'DROP TRIGGER IF EXISTS stats_bookings_delete',
+        *STATS_TOTALS_REBUILD_SQL,
+        f'''
+        CREATE TRIGGER stats_bookings_insert AFTER INSERT ON bookings
+        BEGIN
+            {_STATS_ADD_NEW}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER stats_bookings_update
+        AFTER UPDATE OF status, booking_datetime, service_id, user_id, price ON bookings
+        BEGIN
+            {_STATS_REMOVE_OLD}
+            {_STATS_ADD_NEW}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER stats_bookings_delete AFTER DELETE ON bookings
+        BEGIN
+            {_STATS_REMOVE_OLD}
+        END
+        ''',
+    ],
+    # 15: счетчики по дням для отчетов вместо дневных сводок, которые пересчитывались при чтении
+    [
+        'DROP TRIGGER IF EXISTS rollups_bookings_insert',
+        'DROP TRIGGER IF EXISTS rollups_bookings_update',
+        'DROP TRIGGER IF EXISTS rollups_bookings_delete',
+        'DROP TABLE IF EXISTS daily_rollups',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_daily_services (
+            day TEXT NOT NULL,
+            service_id INTEGER NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            confirmed INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, service_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stats_daily_clients (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        )
+        ''',
+        *STATS_DAYS_REBUILD_SQL,
+        f'''
+        CREATE TRIGGER IF NOT EXISTS stats_days_bookings_insert AFTER INSERT ON bookings
+        BEGIN
+            {_DAY_STATS_ADD_NEW}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS stats_days_bookings_update
+        AFTER UPDATE OF status, booking_datetime, service_id, user_id, price ON bookings
+        BEGIN
+            {_DAY_STATS_REMOVE_OLD}
+            {_DAY_STATS_ADD_NEW}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS stats_days_bookings_delete AFTER DELETE ON bookings
+        BEGIN
+            {_DAY_STATS_REMOVE_OLD}
+        END
+        ''',
+    ],
+]
+
+# Текущая версия схемы: база с этой версией уже создана и заполнена
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def db_connection():
+    """Получить соединение из пула (контекстный менеджер)"""
+    return pool.connection()
+
+service_catalog = ServiceCatalog(db_connection, check_interval=config.CATALOG_CHECK_INTERVAL)
+
+# Активные записи периода с длительностью услуги (расчет свободного времени)
+ACTIVE_BOOKINGS_SQL = '''
+    SELECT b.booking_datetime, s.duration_minutes
+    FROM bookings b
+    JOIN services s ON b.service_id = s.service_id
+    WHERE b.booking_datetime >= ? AND b.booking_datetime < ?
+    AND b.status IN ('confirmed', 'pending')
+'''
+
+def day_range(day, days: int = 1) -> Tuple[str, str]:
+    """Границы [начало, конец) периода для сравнения с booking_datetime.
+
+    Сравнение столбца с границами использует индекс, в отличие от DATE(booking_datetime).
+    """
+    if isinstance(day, str):
+        day = datetime.date.fromisoformat(day)
+    return day.isoformat(), (day + datetime.timedelta(days=days)).isoformat()
+
+def apply_migrations(cursor: sqlite3.Cursor):
+    """Применить недостающие миграции схемы"""
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'PRAGMA user_version = {number}')
+
+@pool.retry_on_busy
+def init_db() -> bool:
+    """Инициализация базы данных.
+
+    Возвращает False, если схема уже актуальна и создавать ничего не пришлось.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Быстрый путь холодного старта: таблицы, услуги и миграции уже на месте
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return False
+
+        # Таблица пользователей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                phone TEXT,
+                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Таблица услуг
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS services (
+                service_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                price DECIMAL(10, 2) NOT NULL,
+                duration_minutes INTEGER NOT NULL,
+                description TEXT
+            )
+        ''')
+
+        # Таблица записей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bookings(
+                booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                service_id INTEGER NOT NULL,
+                booking_datetime DATETIME NOT NULL,
+                status TEXT DEFAULT 'pending',
+                notes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id),
+                FOREIGN KEY (service_id) REFERENCES services (service_id)
+            )          
+        ''')
+
+        # Таблица администраторов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS admins (
+                user_id INTEGER PRIMARY KEY,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Заполняем услуги
+        default_services = [
+            (1, 'Дизайн ногтей', 150, 15, 'Создание уникального дизайна'),
+            (2, 'Комбинированный маникюр', 1500, 45, 'Комбинированная обработка кутикулы'),
+            (3, 'Мужской маникюр', 2000, 60, 'Уход за мужскими руками'),
+            (4, 'Маникюр с покрытием гель-лаком', 5000, 120, 'Маникюр с гель-лаком'),
+            (5, 'Наращивание ногтей', 7500, 240, 'Удлинение ногтевой пластины'),
+            (6, 'Японский маникюр', 2500, 60, 'Японская технология ухода'),
+            (7, 'Педикюр с покрытием гель-лаком', 5000, 120, 'Уход за стопами'),
+            (8, 'Снятие гель-лака', 1000, 30, 'Аккуратное снятие покрытия'),
+            (9, 'Обработка сложного участка', 1500, 20, 'Решение проблемных зон'),
+            (10, 'Маникюр с покрытием гелем', 4000, 120, 'Укрепление гелем')
+        ]
     
-    cursor.executemany(
-        'INSERT OR IGNORE INTO services (service_id, name, price, duration_minutes, description) VALUES (?, ?, ?, ?, ?)',
-        default_services
-    )
+        cursor.executemany(
+            'INSERT OR IGNORE INTO services (service_id, name, price, duration_minutes, description) VALUES (?, ?, ?, ?, ?)',
+            default_services
+        )
+        
+        apply_migrations(cursor)
     
-    conn.commit()
-    conn.close()
+    return True
 
 # Функции для пользователей
+@pool.retry_on_busy
 def save_user(user_id: int, username: str, first_name: str, last_name: str = None):
     """Сохранить/обновить пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, last_activity) 
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (user_id, username, first_name, last_name))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Upsert, а не REPLACE: телефон и дата регистрации сохраняются,
+        # триггеры поискового индекса срабатывают только при смене имени
+        cursor.execute('''
+            INSERT INTO users (user_id, username, first_name, last_name, last_activity) 
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                last_activity = excluded.last_activity
+        ''', (user_id, username, first_name, last_name))
 
 def get_user(user_id: int):
     """Получить пользователя по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        user = cursor.fetchone()
+        return user
 
 # Функции для услуг
 def get_services() -> List[sqlite3.Row]:
-    """Получить все услуги"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM services ORDER BY price')
-    services = cursor.fetchall()
-    conn.close()
-    return services
+    """Получить все услуги (из каталога в памяти)"""
+    return service_catalog.get_all()
 
 def get_service_by_id(service_id: int):
-    """Получить услугу по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM services WHERE service_id = ?', (service_id,))
-    service = cursor.fetchone()
-    conn.close()
-    return service
+    """Получить услугу по ID (из каталога в памяти)"""
+    return service_catalog.get(service_id)
 
 # Функции для записей
-def create_booking(user_id: int, service_id: int, booking_datetime: str) -> Tuple[bool, str, int]:
-    """Создать новую запись"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+def _occupied_minutes(booking_datetime: str, duration: int) -> Set[int]:
+    """Минуты суток, с которых начинаются слоты, занятые записью (как в DayBitmap.busy_mask)"""
+    start = time_to_minutes(booking_datetime[11:16])
+    return {start + step * SLOT_MINUTES for step in range(slots_needed(duration))}
+
+@pool.retry_on_busy
+def _insert_booking(user_id: int, service_id: int, booking_datetime: str, duration: int,
+                    idempotency_key: str = None) -> Tuple[bool, str, int]:
+    """Добавить запись, если ее время свободно.
+
+    Проверка ключа идемпотентности, проверка пересечений и вставка идут в одной
+    транзакции BEGIN IMMEDIATE: параллельное подтверждение того же времени ждет
+    ее окончания и видит уже созданную запись.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+
+        if idempotency_key:
+            cursor.execute('SELECT booking_id FROM bookings WHERE idempotency_key = ?', (idempotency_key,))
+            row = cursor.fetchone()
+            if row:
+                return False, "Эта запись уже оформлена", row[0]
+
+        needed = _occupied_minutes(booking_datetime, duration)
+        cursor.execute(ACTIVE_BOOKINGS_SQL, day_range(booking_datetime[:10]))
+        for existing_datetime, existing_duration in cursor.fetchall():
+            if needed & _occupied_minutes(existing_datetime, existing_duration):
+                return False, "Это время уже занято. Для новой записи нажмите /start", 0
+
+        # Цена фиксируется в записи: по ней считается выручка, даже если цену услуги изменят
         cursor.execute('''
-            INSERT INTO bookings (user_id, service_id, booking_datetime, status)
-            VALUES (?, ?, ?, 'pending')
-        ''', (user_id, service_id, booking_datetime))
-        
-        booking_id = cursor.lastrowid
-        conn.commit()
-        return True, "Запись создана", booking_id
+            INSERT INTO bookings (user_id, service_id, booking_datetime, status, idempotency_key, price)
+            VALUES (?, ?, ?, 'pending', ?, (SELECT price FROM services WHERE service_id = ?))
+        ''', (user_id, service_id, booking_datetime, idempotency_key, service_id))
+        return True, "Запись создана", cursor.lastrowid
+
+def get_booking_id_by_idempotency_key(idempotency_key: str) -> Optional[int]:
+    """ID записи, уже созданной с этим ключом идемпотентности"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT booking_id FROM bookings WHERE idempotency_key = ?', (idempotency_key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def create_booking(user_id: int, service_id: int, booking_datetime: str,
+                   idempotency_key: str = None) -> Tuple[bool, str, int]:
+    """Создать новую запись.
+
+    Повторный вызов с тем же ключом идемпотентности не создает вторую запись,
+    а возвращает (False, сообщение, ID уже созданной записи). Если время
+    пересекается с другой активной записью, возвращает (False, сообщение, 0).
+    """
+    service = get_service_by_id(service_id)
+    if service is None:
+        return False, "Ошибка: услуга не найдена", 0
+
+    try:
+        result = _insert_booking(
+            user_id, service_id, booking_datetime, service['duration_minutes'], idempotency_key
+        )
+    except sqlite3.IntegrityError as e:
+        existing_id = get_booking_id_by_idempotency_key(idempotency_key) if idempotency_key else None
+        if existing_id:
+            return False, "Эта запись уже оформлена", existing_id
+        return False, f"Ошибка: {str(e)}", 0
     except Exception as e:
-        conn.rollback()
         return False, f"Ошибка: {str(e)}", 0
-    finally:
-        conn.close()
+
+    if result[0]:
+        availability_cache.invalidate_date(booking_datetime[:10])
+    return result
 
 def get_user_bookings(user_id: int):
     """Получить записи пользователя"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT b.*, s.name, s.price 
-        FROM bookings b
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.user_id = ?
-        ORDER BY b.booking_datetime DESC
-    ''', (user_id,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    query = BookingQuery(BOOKING_COLUMNS + ('service_name', 'price')).user(user_id).order_by('datetime_desc')
+
+    with db_connection() as conn:
+        return query.fetchall(conn)
 
+@pool.retry_on_busy
 def update_booking_status(booking_id: int, status: str):
     """Обновить статус записи"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute('UPDATE bookings SET status = ? WHERE booking_id = ?', (status, booking_id))
-    conn.commit()
-    conn.close()
+        cursor.execute('SELECT booking_datetime, status FROM bookings WHERE booking_id = ?', (booking_id,))
+        booking = cursor.fetchone()
+        cursor.execute('UPDATE bookings SET status = ? WHERE booking_id = ?', (status, booking_id))
+        
+        # Напоминание нужно только подтвержденной записи
+        if booking and status == 'confirmed':
+            booking_dt = datetime.datetime.strptime(booking['booking_datetime'], '%Y-%m-%d %H:%M:%S')
+            remind_at = booking_dt - datetime.timedelta(hours=config.REMINDER_HOURS_BEFORE)
+            cursor.execute('''
+                INSERT INTO reminders (booking_id, remind_at) VALUES (?, ?)
+                ON CONFLICT (booking_id) DO UPDATE SET remind_at = excluded.remind_at
+                WHERE sent_at IS NULL
+            ''', (booking_id, remind_at.strftime('%Y-%m-%d %H:%M:%S')))
+        else:
+            cursor.execute('DELETE FROM reminders WHERE booking_id = ? AND sent_at IS NULL', (booking_id,))
+    
+    # Свободное время меняется, только если запись начала или перестала занимать слоты
+    if booking and (booking['status'] in ACTIVE_STATUSES) != (status in ACTIVE_STATUSES):
+        availability_cache.invalidate_date(booking['booking_datetime'][:10])
+
+# Функции для напоминаний
+def get_next_reminder_time() -> Optional[datetime.datetime]:
+    """Время ближайшего неотправленного напоминания"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(remind_at) FROM reminders WHERE sent_at IS NULL')
+        remind_at = cursor.fetchone()[0]
+    
+    if remind_at is None:
+        return None
+    return datetime.datetime.strptime(remind_at, '%Y-%m-%d %H:%M:%S')
+
+@pool.retry_on_busy
+def claim_due_reminders(now: datetime.datetime, limit: Optional[int] = None) -> List[sqlite3.Row]:
+    """Отметить наступившие напоминания в журнале и вернуть те, что еще нужно отправить.
+
+    Отметка ставится до отправки, поэтому напоминание не уйдет дважды даже после перезапуска.
+    limit - сколько напоминаний (самых ранних) забрать за раз, остальные ждут следующего вызова.
+    """
+    now_str = now.strftime('%Y-%m-%d %H:%M:%S')
+    
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT 
+                r.booking_id,
+                b.user_id,
+                s.name as service_name,
+                b.booking_datetime,
+                b.status,
+                s.duration_minutes
+            FROM reminders r
+            JOIN bookings b ON r.booking_id = b.booking_id
+            JOIN services s ON b.service_id = s.service_id
+            WHERE r.sent_at IS NULL AND r.remind_at <= ?
+            ORDER BY r.remind_at
+            LIMIT ?
+        ''', (now_str, -1 if limit is None else limit))
+        due = cursor.fetchall()
+        
+        claimed = []
+        for reminder in due:
+            cursor.execute(
+                'UPDATE reminders SET sent_at = ? WHERE booking_id = ? AND sent_at IS NULL',
+                (now_str, reminder['booking_id'])
+            )
+            # Запись могла быть отменена или уже пройти, пока бот не работал
+            if cursor.rowcount and reminder['status'] == 'confirmed' and reminder['booking_datetime'] > now_str:
+                claimed.append(reminder)
+        
+        return claimed
+
+# Функции для журнала обработанных обновлений
+@pool.retry_on_busy
+def claim_update(update_id: int) -> bool:
+    """Отметить обновление как обработанное; False, если оно уже было"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT OR IGNORE INTO processed_updates (update_id, processed_at) VALUES (?, ?)',
+            (update_id, time.time())
+        )
+        return cursor.rowcount == 1
+
+@pool.retry_on_busy
+def release_update(update_id: int):
+    """Снять отметку с обновления, обработка которого не удалась (повтор будет обработан)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM processed_updates WHERE update_id = ?', (update_id,))
+
+@pool.retry_on_busy
+def delete_expired_updates(max_age: float) -> int:
+    """Удалить из журнала старые обновления и вернуть их количество"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM processed_updates WHERE processed_at < ?', (time.time() - max_age,))
+        return cursor.rowcount
+
+# Функции для состояний FSM
+def load_fsm_record(storage_key: str, max_age: float,
+                    known_revision: Optional[str] = None) -> Optional[Tuple[str, bool, Optional[str], Optional[str]]]:
+    """Сессия FSM: (метка версии, не изменилась ли, состояние, данные - JSON).
+
+    Если метка совпадает с known_revision, состояние и данные не читаются (None).
+    Возвращает None, если сессии нет или она брошена.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                revision,
+                revision IS NOT NULL AND revision = :known AS unchanged,
+                CASE WHEN revision IS NOT NULL AND revision = :known THEN NULL ELSE state END AS state,
+                CASE WHEN revision IS NOT NULL AND revision = :known THEN NULL ELSE data END AS data
+            FROM fsm_storage
+            WHERE storage_key = :key AND updated_at >= :since
+        ''', {'key': storage_key, 'known': known_revision, 'since': time.time() - max_age})
+        row = cursor.fetchone()
+        return (row['revision'], bool(row['unchanged']), row['state'], row['data']) if row else None
+
+@pool.retry_on_busy
+def save_fsm_field(storage_key: str, field: str, value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Записать состояние или данные сессии (upsert); пустая сессия удаляется.
+
+    Возвращает метку версии до записи и после (None, если сессии нет).
+    """
+    if field not in ('state', 'data'):
+        raise ValueError(f"Неизвестное поле сессии: {field}")
+
+    revision = uuid.uuid4().hex
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Прежняя метка и запись - в одной транзакции, чтобы между ними не вклинился другой процесс
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT revision FROM fsm_storage WHERE storage_key = ?', (storage_key,))
+        row = cursor.fetchone()
+        previous = row[0] if row else None
+
+        cursor.execute(f'''
+            INSERT INTO fsm_storage (storage_key, {field}, updated_at, revision) VALUES (?, ?, ?, ?)
+            ON CONFLICT (storage_key) DO UPDATE SET
+                {field} = excluded.{field}, updated_at = excluded.updated_at, revision = excluded.revision
+        ''', (storage_key, value, time.time(), revision))
+        cursor.execute(
+            "DELETE FROM fsm_storage WHERE storage_key = ? AND state IS NULL AND data = '{}'",
+            (storage_key,)
+        )
+        return previous, (None if cursor.rowcount else revision)
+
+@pool.retry_on_busy
+def delete_expired_fsm_records(max_age: float) -> int:
+    """Удалить брошенные сессии и вернуть их количество"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM fsm_storage WHERE updated_at < ?', (time.time() - max_age,))
+        return cursor.rowcount
 
 # Функции для администраторов
+# Администраторы хранятся в памяти, и проверка is_admin не обращается к базе.
+# Набор перечитывается, если изменилась версия таблицы admins: сверку через
+# refresh_admins вызывает обработка обновлений не чаще раза в ADMIN_CHECK_INTERVAL
+_admin_ids: Optional[Set[int]] = None
+_admins_version: Optional[int] = None
+_admins_checked_at = 0.0
+
+def _admins_table_version(cursor: sqlite3.Cursor) -> int:
+    """Версия таблицы admins (ее увеличивают триггеры)"""
+    cursor.execute("SELECT version FROM table_versions WHERE table_name = 'admins'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def load_admins() -> Set[int]:
+    """Загрузить администраторов из базы в память"""
+    global _admin_ids, _admins_version, _admins_checked_at
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        version = _admins_table_version(cursor)
+        cursor.execute('SELECT user_id FROM admins')
+        _admin_ids = {row[0] for row in cursor.fetchall()}
+    _admins_version = version
+    _admins_checked_at = time.monotonic()
+    return _admin_ids
+
+def _get_admin_ids() -> Set[int]:
+    """Набор ID администраторов (загружается из базы один раз)"""
+    if _admin_ids is None:
+        return load_admins()
+    return _admin_ids
+
+def admins_check_due() -> bool:
+    """Пора ли сверить список администраторов с базой.
+
+    Отметка о сверке ставится сразу, чтобы параллельные обновления не запускали ее повторно.
+    """
+    global _admins_checked_at
+    now = time.monotonic()
+    if now - _admins_checked_at < config.ADMIN_CHECK_INTERVAL:
+        return False
+    _admins_checked_at = now
+    return True
+
+def refresh_admins() -> Set[int]:
+    """Перечитать администраторов, если список изменили (в том числе другие процессы)"""
+    with db_connection() as conn:
+        version = _admins_table_version(conn.cursor())
+    if _admin_ids is None or version != _admins_version:
+        return load_admins()
+    return _admin_ids
+
 def is_admin(user_id: int) -> bool:
-    """Проверить, является ли пользователь администратором"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT 1 FROM admins WHERE user_id = ?', (user_id,))
-    result = cursor.fetchone() is not None
-    conn.close()
-    return result
+    """Проверить, является ли пользователь администратором (по набору в памяти)"""
+    return user_id in _get_admin_ids()
 
+@pool.retry_on_busy
 def add_admin(user_id: int):
     """Добавить администратора"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT OR IGNORE INTO admins (user_id) VALUES (?)', (user_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO admins (user_id) VALUES (?)', (user_id,))
+    
+    _get_admin_ids().add(user_id)
 
 def get_all_admins():
     """Получить всех администраторов"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_id FROM admins')
-    admins = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return admins
+    return list(_get_admin_ids())
 
 # Функции для статистики
+def _amount(value):
+    """Сумма из счетчика: целое число, если нет дробной части"""
+    return int(value) if value == int(value) else value
+
 def get_statistics():
-    """Получить статистику"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Получить статистику (из счетчиков, которые поддерживают триггеры)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    stats = {}
+        cursor.execute('SELECT status, bookings, revenue FROM stats_status')
+        by_status = {row['status']: row for row in cursor.fetchall()}
     
-    # Подтвержденные записи
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'confirmed'")
-    stats['confirmed'] = cursor.fetchone()[0]
+        cursor.execute('SELECT name, value FROM stats_counters')
+        counters = {row['name']: row['value'] for row in cursor.fetchall()}
     
-    # Ожидающие подтверждения
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'pending'")
-    stats['pending'] = cursor.fetchone()[0]
-    
-    # Записи на сегодня
-    today = datetime.date.today()
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE DATE(booking_datetime) = ? AND status = 'confirmed'", (today,))
-    stats['today'] = cursor.fetchone()[0]
-    
-    # Общая выручка
-    cursor.execute("SELECT SUM(s.price) FROM bookings b JOIN services s ON b.service_id = s.service_id WHERE b.status = 'confirmed'")
-    stats['revenue'] = cursor.fetchone()[0] or 0
+        cursor.execute(
+            "SELECT bookings FROM stats_daily WHERE day = ? AND status = 'confirmed'",
+            (datetime.date.today().isoformat(),)
+        )
+        today = cursor.fetchone()
     
-    # Уникальные клиенты
-    cursor.execute("SELECT COUNT(DISTINCT user_id) FROM bookings")
-    stats['unique_clients'] = cursor.fetchone()[0]
+        confirmed = by_status.get('confirmed')
+        pending = by_status.get('pending')
+        revenue = confirmed['revenue'] if confirmed else 0
     
-    # Всего пользователей
-    cursor.execute("SELECT COUNT(*) FROM users")
-    stats['total_users'] = cursor.fetchone()[0]
+        return {
+            'confirmed': confirmed['bookings'] if confirmed else 0,
+            'pending': pending['bookings'] if pending else 0,
+            'today': today['bookings'] if today else 0,
+            'revenue': _amount(revenue),
+            'unique_clients': counters.get('clients', 0),
+            'total_users': counters.get('users', 0),
+        }
+
+def _stats_snapshot(cursor: sqlite3.Cursor) -> dict:
+    """Содержимое таблиц статистики для сравнения"""
+    snapshot = {}
+    cursor.execute('SELECT status, bookings, revenue FROM stats_status WHERE bookings != 0')
+    snapshot['status'] = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    cursor.execute('SELECT day, status, bookings, revenue FROM stats_daily WHERE bookings != 0')
+    snapshot['daily'] = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    cursor.execute('SELECT name, value FROM stats_counters')
+    snapshot['counters'] = {row[0]: row[1] for row in cursor.fetchall()}
+    cursor.execute('SELECT day, service_id, bookings, confirmed, revenue FROM stats_daily_services')
+    snapshot['daily_services'] = {(row[0], row[1]): (row[2], row[3], row[4]) for row in cursor.fetchall()}
+    cursor.execute('SELECT day, user_id, bookings FROM stats_daily_clients')
+    snapshot['daily_clients'] = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    return snapshot
+
+@pool.retry_on_busy
+def verify_statistics() -> List[str]:
+    """Сравнить счетчики статистики с пересчетом по таблицам.
+
+    Пересчет выполняется в транзакции и откатывается. Возвращает список расхождений.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SAVEPOINT verify_statistics')
+        try:
+            current = _stats_snapshot(cursor)
+            for statement in STATS_REBUILD_SQL:
+                cursor.execute(statement)
+            expected = _stats_snapshot(cursor)
+        finally:
+            cursor.execute('ROLLBACK TO verify_statistics')
+            cursor.execute('RELEASE verify_statistics')
     
-    conn.close()
-    return stats
+    mismatches = []
+    for section, expected_values in expected.items():
+        current_values = current[section]
+        for key in sorted(set(expected_values) | set(current_values), key=str):
+            if current_values.get(key) != expected_values.get(key):
+                mismatches.append(f"{section} {key}: {current_values.get(key)} != {expected_values.get(key)}")
+    return mismatches
+
+@pool.retry_on_busy
+def rebuild_statistics():
+    """Пересчитать счетчики статистики с нуля"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for statement in STATS_REBUILD_SQL:
+            cursor.execute(statement)
 
 # Функции для уведомлений
+def _audience_date(group: str) -> Optional[str]:
+    """Дата записей, клиентов которых нужно уведомить (None - все клиенты)"""
+    if group == 'today':
+        return datetime.date.today().isoformat()
+    if group == 'tomorrow':
+        return (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+    return None
+
+def _audience_filter(audience_date: Optional[str]) -> Tuple[str, tuple]:
+    """Условие отбора клиентов для уведомления"""
+    if audience_date is None:
+        return 'user_id IS NOT NULL', ()
+    return "status = 'confirmed' AND booking_datetime >= ? AND booking_datetime < ?", day_range(audience_date)
+
 def get_clients_for_notification(group: str = 'all'):
     """Получить клиентов для уведомления"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if group == 'today':
-        today = datetime.date.today()
+    where, params = _audience_filter(_audience_date(group))
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT DISTINCT user_id FROM bookings WHERE {where}', params)
+
+        clients = [row[0] for row in cursor.fetchall()]
+        return clients
+
+# Функции для рассылок
+@pool.retry_on_busy
+def create_broadcast_job(group: str, text: str, admin_chat_id: int) -> int:
+    """Создать задание рассылки и вернуть его ID.
+
+    Дата группы (сегодня/завтра) фиксируется при создании, чтобы после
+    перезапуска рассылка продолжилась по тем же клиентам.
+    """
+    audience_date = _audience_date(group)
+    where, params = _audience_filter(audience_date)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(DISTINCT user_id) FROM bookings WHERE {where}', params)
+        total = cursor.fetchone()[0]
+
         cursor.execute('''
-            SELECT DISTINCT b.user_id 
-            FROM bookings b
-            WHERE DATE(b.booking_datetime) = ? AND b.status = 'confirmed'
-        ''', (today,))
-    elif group == 'tomorrow':
-        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+            INSERT INTO broadcast_jobs (audience, audience_date, text, total_count, admin_chat_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (group, audience_date, text, total, admin_chat_id))
+        return cursor.lastrowid
+
+def get_broadcast_job(job_id: int):
+    """Получить задание рассылки по ID"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM broadcast_jobs WHERE job_id = ?', (job_id,))
+        return cursor.fetchone()
+
+def get_running_broadcast_jobs() -> List[int]:
+    """ID незавершенных рассылок (для продолжения после перезапуска)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT job_id FROM broadcast_jobs WHERE status = 'running' ORDER BY job_id")
+        return [row[0] for row in cursor.fetchall()]
+
+@pool.retry_on_busy
+def set_broadcast_progress_message(job_id: int, message_id: int):
+    """Запомнить сообщение, в котором показывается ход рассылки"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE broadcast_jobs SET progress_message_id = ? WHERE job_id = ?',
+            (message_id, job_id)
+        )
+
+@pool.retry_on_busy
+def claim_broadcast_chunk(job_id: int, limit: int) -> List[int]:
+    """Забрать следующую порцию получателей рассылки.
+
+    Получатели читаются порциями по курсору last_user_id, а не все сразу. Каждый
+    получатель отмечается в журнале доставки до отправки, поэтому после
+    перезапуска он не получит сообщение повторно.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Курсор читается и сдвигается в одной транзакции: параллельные вызовы
+        # (serverless) забирают разные порции
+        if not conn.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            "SELECT audience_date, last_user_id FROM broadcast_jobs WHERE job_id = ? AND status = 'running'",
+            (job_id,)
+        )
+        job = cursor.fetchone()
+        if job is None:
+            return []
+
+        where, params = _audience_filter(job['audience_date'])
+        cursor.execute(f'''
+            SELECT DISTINCT user_id FROM bookings
+            WHERE {where} AND user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        ''', params + (job['last_user_id'], limit))
+        user_ids = [row[0] for row in cursor.fetchall()]
+
+        if user_ids:
+            claimed_at = time.time()
+            cursor.executemany(
+                'INSERT OR IGNORE INTO broadcast_deliveries (job_id, user_id, claimed_at) VALUES (?, ?, ?)',
+                [(job_id, user_id, claimed_at) for user_id in user_ids]
+            )
+            cursor.execute(
+                'UPDATE broadcast_jobs SET last_user_id = ? WHERE job_id = ?',
+                (user_ids[-1], job_id)
+            )
+        return user_ids
+
+@pool.retry_on_busy
+def record_broadcast_results(job_id: int, results: List[Tuple[int, bool]]):
+    """Записать результаты отправки порции рассылки.
+
+    Учитываются только доставки, которые еще числятся захваченными: уже закрытые
+    как прерванные повторно не считаются.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        counts = {}
+        for status in ('sent', 'failed'):
+            cursor.executemany(
+                "UPDATE broadcast_deliveries SET status = ? WHERE job_id = ? AND user_id = ? AND status = 'claimed'",
+                [(status, job_id, user_id) for user_id, ok in results if ok == (status == 'sent')]
+            )
+            counts[status] = max(cursor.rowcount, 0)
         cursor.execute('''
-            SELECT DISTINCT b.user_id 
-            FROM bookings b
-            WHERE DATE(b.booking_datetime) = ? AND b.status = 'confirmed'
-        ''', (tomorrow,))
-    else:  # all
-        cursor.execute("SELECT DISTINCT user_id FROM bookings WHERE user_id IS NOT NULL")
-    
-    clients = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return clients
+            UPDATE broadcast_jobs
+            SET sent_count = sent_count + ?, failed_count = failed_count + ?
+            WHERE job_id = ?
+        ''', (counts['sent'], counts['failed'], job_id))
+
+@pool.retry_on_busy
+def abandon_claimed_deliveries(job_id: int, older_than: float = 0) -> int:
+    """Закрыть доставки, прерванные перезапуском.
+
+    Неизвестно, дошло ли сообщение до этих получателей, поэтому повторно
+    оно не отправляется, а в задании они считаются неудачными. older_than -
+    сколько секунд доставка должна висеть захваченной, чтобы не задеть
+    порцию, которую прямо сейчас отправляет другой процесс.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE broadcast_deliveries SET status = 'unknown'
+            WHERE job_id = ? AND status = 'claimed' AND (claimed_at IS NULL OR claimed_at <= ?)
+        ''', (job_id, time.time() - older_than))
+        abandoned = cursor.rowcount
+        if abandoned:
+            cursor.execute(
+                'UPDATE broadcast_jobs SET failed_count = failed_count + ? WHERE job_id = ?',
+                (abandoned, job_id)
+            )
+        return abandoned
+
+@pool.retry_on_busy
+def finish_broadcast_job(job_id: int):
+    """Отметить рассылку завершенной"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE broadcast_jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (job_id,)
+        )
 
 
 # Функции для работы с записями администратора
 def get_pending_bookings():
     """Получить все записи, ожидающие подтверждения"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.status = 'pending'
-        ORDER BY b.booking_datetime ASC
-    ''')
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    with db_connection() as conn:
+        return _booking_list_query('pending').fetchall(conn)
 
 def get_today_bookings():
     """Получить подтвержденные записи на сегодня"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    today = datetime.date.today()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) = ? 
-        AND b.status = 'confirmed'
-        ORDER BY b.booking_datetime ASC
-    ''', (today,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    with db_connection() as conn:
+        return _booking_list_query('today').fetchall(conn)
 
 def get_tomorrow_bookings():
     """Получить подтвержденные записи на завтра"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        return _booking_list_query('tomorrow').fetchall(conn)
+
+# Списки записей для постраничного просмотра администратором
+def _booking_list_query(list_name: str) -> BookingQuery:
+    """Запрос записей для списка администратора"""
+    if list_name == 'pending':
+        return BookingQuery().status('pending')
+    if list_name == 'today':
+        return BookingQuery().status('confirmed').period(*day_range(datetime.date.today()))
+    if list_name == 'tomorrow':
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        return BookingQuery().status('confirmed').period(*day_range(tomorrow))
+    raise ValueError(f"Неизвестный список записей: {list_name}")
+
+def get_bookings_page(list_name: str, limit: int, after: Optional[Tuple[str, int]] = None,
+                      before: Optional[Tuple[str, int]] = None) -> Tuple[List[sqlite3.Row], bool, bool]:
+    """Страница списка записей по курсору (booking_datetime, booking_id).
+
+    after - курсор последней записи предыдущей страницы (листаем вперед),
+    before - курсор первой записи следующей страницы (листаем назад).
+    Возвращает записи по возрастанию времени и признаки наличия страниц до и после.
+    """
+    query = _booking_list_query(list_name).limit(limit + 1)
+    backward = before is not None
     
-    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    if backward:
+        query.before(before).order_by('datetime_desc')
+    elif after:
+        query.after(after)
     
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) = ? 
-        AND b.status = 'confirmed'
-        ORDER BY b.booking_datetime ASC
-    ''', (tomorrow,))
+    with db_connection() as conn:
+        bookings = query.fetchall(conn)
     
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    # Лишняя запись показывает, что в этом направлении есть еще страница
+    has_more = len(bookings) > limit
+    bookings = bookings[:limit]
+    
+    if backward:
+        bookings.reverse()
+        return bookings, has_more, True
+    return bookings, after is not None, has_more
 
 def get_booking_by_id(booking_id: int):
     """Получить запись по ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.*,
-            u.first_name,
-            u.username,
-            u.phone,
-            s.name as service_name,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.booking_id = ?
-    ''', (booking_id,))
-    
-    booking = cursor.fetchone()
-    conn.close()
-    return booking
+    query = BookingQuery(
+        BOOKING_COLUMNS + ('first_name', 'username', 'phone', 'service_name', 'price', 'duration_minutes')
+    ).booking(booking_id)
+
+    with db_connection() as conn:
+        return query.fetchone(conn)
 
 def get_week_bookings():
     """Получить записи на текущую неделю"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     today = datetime.date.today()
     week_start = today - datetime.timedelta(days=today.weekday())
-    week_end = week_start + datetime.timedelta(days=6)
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) BETWEEN ? AND ?
-        AND b.status = 'confirmed'
-        ORDER BY b.booking_datetime ASC
-    ''', (week_start, week_end))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
-
-def get_all_bookings(limit: int = 100, offset: int = 0):
-    """Получить все записи (для администратора)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes,
-            b.created_at
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        ORDER BY b.booking_datetime DESC
-        LIMIT ? OFFSET ?
-    ''', (limit, offset))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
-
-def search_bookings(search_term: str):
-    """Поиск записей по имени клиента или услуге"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    search_pattern = f"%{search_term}%"
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE u.first_name LIKE ? 
-           OR u.username LIKE ? 
-           OR s.name LIKE ?
-        ORDER BY b.booking_datetime DESC
-        LIMIT 50
-    ''', (search_pattern, search_pattern, search_pattern))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    query = BookingQuery().status('confirmed').period(*day_range(week_start, days=7))
+
+    with db_connection() as conn:
+        return query.fetchall(conn)
+
+def get_all_bookings(limit: int = 100, before: Optional[Tuple[str, int]] = None):
+    """Получить все записи (для администратора), от новых к старым.
+
+    Следующая страница запрашивается по курсору before = (booking_datetime, booking_id)
+    последней записи предыдущей страницы, поэтому глубокие страницы не медленнее первой.
+    """
+    query = BookingQuery(LIST_COLUMNS + ('created_at',)).order_by('datetime_desc').limit(limit)
+    if before:
+        query.before(before)
+
+    with db_connection() as conn:
+        return query.fetchall(conn)
+
+def _fts_query(search_term: str) -> Optional[str]:
+    """Запрос FTS5 из поисковой строки или None, если индекс не подходит.
+
+    Каждое слово ищется как подстрока (триграммы), все слова должны встретиться.
+    Слова короче трех символов триграммный индекс не находит.
+    """
+    words = search_term.split()
+    if not words or any(len(word) < 3 for word in words):
+        return None
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+def search_bookings(search_term: str, limit: int = 50):
+    """Поиск записей по имени клиента, username или услуге.
+
+    Ищет по полнотекстовому индексу bookings_fts, лучшие совпадения первыми;
+    короткие запросы ищутся через LIKE.
+    """
+    fts_query = _fts_query(search_term)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+
+        if fts_query is not None:
+            cursor.execute('''
+                SELECT
+                    b.booking_id,
+                    b.user_id,
+                    u.first_name,
+                    u.username,
+                    s.name as service_name,
+                    b.booking_datetime,
+                    b.status,
+                    s.price,
+                    s.duration_minutes
+                FROM bookings_fts f
+                JOIN bookings b ON b.booking_id = f.rowid
+                JOIN users u ON b.user_id = u.user_id
+                JOIN services s ON b.service_id = s.service_id
+                WHERE bookings_fts MATCH ?
+                ORDER BY f.rank, b.booking_datetime DESC
+                LIMIT ?
+            ''', (fts_query, limit))
+        else:
+            search_pattern = f"%{search_term.strip()}%"
+            cursor.execute('''
+                SELECT
+                    b.booking_id,
+                    b.user_id,
+                    u.first_name,
+                    u.username,
+                    s.name as service_name,
+                    b.booking_datetime,
+                    b.status,
+                    s.price,
+                    s.duration_minutes
+                FROM bookings b
+                JOIN users u ON b.user_id = u.user_id
+                JOIN services s ON b.service_id = s.service_id
+                WHERE u.first_name LIKE ?
+                   OR u.username LIKE ?
+                   OR s.name LIKE ?
+                ORDER BY b.booking_datetime DESC
+                LIMIT ?
+            ''', (search_pattern, search_pattern, search_pattern, limit))
+
+        bookings = cursor.fetchall()
+        return bookings
 
 def get_bookings_by_date(date_str: str):
     """Получить записи на конкретную дату"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) = ?
-        ORDER BY b.booking_datetime ASC
-    ''', (date_str,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    with db_connection() as conn:
+        return BookingQuery().period(*day_range(date_str)).fetchall(conn)
 
 def get_bookings_by_user_id(user_id: int):
     """Получить все записи пользователя (для администратора)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes,
-            b.created_at
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.user_id = ?
-        ORDER BY b.booking_datetime DESC
-    ''', (user_id,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    query = BookingQuery(LIST_COLUMNS + ('created_at',)).user(user_id).order_by('datetime_desc')
+
+    with db_connection() as conn:
+        return query.fetchall(conn)
 
 def get_bookings_by_status(status: str):
     """Получить записи по статусу"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.status = ?
-        ORDER BY b.booking_datetime DESC
-    ''', (status,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    with db_connection() as conn:
+        return BookingQuery().status(status).order_by('datetime_desc').fetchall(conn)
 
 def count_bookings_by_status(status: str = None):
     """Посчитать количество записей по статусу"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    if status:
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', (status,))
-    else:
-        cursor.execute('SELECT COUNT(*) FROM bookings')
+        if status:
+            cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', (status,))
+        else:
+            cursor.execute('SELECT COUNT(*) FROM bookings')
     
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+        count = cursor.fetchone()[0]
+        return count
 
 def get_recent_bookings(limit: int = 10):
     """Получить последние записи"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.booking_id,
-            b.user_id,
-            u.first_name,
-            u.username,
-            s.name as service_name,
-            b.booking_datetime,
-            b.status,
-            s.price,
-            s.duration_minutes,
-            b.created_at
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        ORDER BY b.created_at DESC
-        LIMIT ?
-    ''', (limit,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    return bookings
+    query = BookingQuery(LIST_COLUMNS + ('created_at',)).order_by('created_desc').limit(limit)
+
+    with db_connection() as conn:
+        return query.fetchall(conn)
+
+def _empty_rollup(day: str) -> dict:
+    """Сводка дня без записей"""
+    return {
+        'date': day,
+        'total_count': 0,
+        'status_counts': {},
+        'daily_revenue': 0,
+        'services': {},
+        'unique_clients': 0,
+    }
+
+def get_daily_rollups(start_date, end_date) -> List[dict]:
+    """Дневные сводки за период [start_date, end_date], по одной на каждый день.
+
+    Собираются из счетчиков статистики, которые поддерживают триггеры: только чтение.
+    Выручка - подтвержденные записи по цене на момент оформления.
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    if isinstance(end_date, str):
+        end_date = datetime.date.fromisoformat(end_date)
+
+    days = (end_date - start_date).days + 1
+    rollups = {}
+    for offset in range(max(days, 0)):
+        day = (start_date + datetime.timedelta(days=offset)).isoformat()
+        rollups[day] = _empty_rollup(day)
+
+    bounds = (start_date.isoformat(), end_date.isoformat())
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT day, status, bookings, revenue FROM stats_daily WHERE day >= ? AND day <= ? AND bookings != 0',
+            bounds
+        )
+        by_status = cursor.fetchall()
+        cursor.execute(
+            'SELECT day, service_id, bookings, confirmed, revenue FROM stats_daily_services WHERE day >= ? AND day <= ?',
+            bounds
+        )
+        by_service = cursor.fetchall()
+        cursor.execute(
+            'SELECT day, COUNT(*) FROM stats_daily_clients WHERE day >= ? AND day <= ? GROUP BY day',
+            bounds
+        )
+        clients = cursor.fetchall()
+
+    for row in by_status:
+        rollup = rollups[row['day']]
+        rollup['status_counts'][row['status']] = row['bookings']
+        rollup['total_count'] += row['bookings']
+        if row['status'] == 'confirmed':
+            rollup['daily_revenue'] = _amount(row['revenue'])
+
+    for row in by_service:
+        service = get_service_by_id(row['service_id'])
+        name = service['name'] if service else f"Услуга #{row['service_id']}"
+        total = rollups[row['day']]['services'].setdefault(name, {'bookings': 0, 'confirmed': 0, 'revenue': 0})
+        total['bookings'] += row['bookings']
+        total['confirmed'] += row['confirmed']
+        total['revenue'] += _amount(row['revenue'])
+
+    for day, count in clients:
+        rollups[day]['unique_clients'] = count
+
+    return list(rollups.values())
 
 def get_daily_statistics(date_str: str = None):
     """Получить статистику на день"""
     if not date_str:
         date_str = datetime.date.today().strftime('%Y-%m-%d')
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Общее количество записей на день
-    cursor.execute('''
-        SELECT COUNT(*) 
-        FROM bookings 
-        WHERE DATE(booking_datetime) = ?
-    ''', (date_str,))
-    total_count = cursor.fetchone()[0]
-    
-    # Количество по статусам
-    cursor.execute('''
-        SELECT status, COUNT(*) 
-        FROM bookings 
-        WHERE DATE(booking_datetime) = ?
-        GROUP BY status
-    ''', (date_str,))
-    status_counts = dict(cursor.fetchall())
-    
-    # Выручка на день
-    cursor.execute('''
-        SELECT SUM(s.price)
-        FROM bookings b
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) = ? AND b.status = 'confirmed'
-    ''', (date_str,))
-    daily_revenue = cursor.fetchone()[0] or 0
-    
-    conn.close()
-    
+
+    return get_daily_rollups(date_str, date_str)[0]
+
+def get_period_report(start_date, days: int) -> dict:
+    """Отчет за период из дневных сводок: итоги, статусы, услуги и данные по дням"""
+    if isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+    end_date = start_date + datetime.timedelta(days=days - 1)
+
+    rollups = get_daily_rollups(start_date, end_date)
+
+    status_counts = {}
+    services = {}
+    for rollup in rollups:
+        for status, count in rollup['status_counts'].items():
+            status_counts[status] = status_counts.get(status, 0) + count
+        for name, service in rollup['services'].items():
+            total = services.setdefault(name, {'bookings': 0, 'confirmed': 0, 'revenue': 0})
+            for key in total:
+                total[key] += service[key]
+
+    # Уникальных клиентов за период нельзя сложить из дневных значений
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT COUNT(DISTINCT user_id) FROM stats_daily_clients WHERE day >= ? AND day <= ?',
+            (start_date.isoformat(), end_date.isoformat())
+        )
+        unique_clients = cursor.fetchone()[0]
+
     return {
-        'date': date_str,
-        'total_count': total_count,
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'total_count': sum(rollup['total_count'] for rollup in rollups),
         'status_counts': status_counts,
-        'daily_revenue': daily_revenue
+        'revenue': sum(rollup['daily_revenue'] for rollup in rollups),
+        'services': services,
+        'unique_clients': unique_clients,
+        'days': rollups,
     }
 
 def get_booking_with_client_info(booking_id: int):
     """Получить запись с полной информацией о клиенте"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            b.*,
-            u.first_name,
-            u.last_name,
-            u.username,
-            u.phone,
-            u.registration_date,
-            s.name as service_name,
-            s.price,
-            s.duration_minutes,
-            s.description as service_description
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.booking_id = ?
-    ''', (booking_id,))
-    
-    booking = cursor.fetchone()
-    conn.close()
-    return booking
+    query = BookingQuery(BOOKING_COLUMNS + (
+        'first_name', 'last_name', 'username', 'phone', 'registration_date',
+        'service_name', 'price', 'duration_minutes', 'service_description'
+    )).booking(booking_id)
+
+    with db_connection() as conn:
+        return query.fetchone(conn)
 
 def get_pending_bookings_count():
     """Получить количество записей, ожидающих подтверждения"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE status = 'pending'")
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+        cursor.execute("SELECT bookings FROM stats_status WHERE status = 'pending'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
 
 def get_today_bookings_count():
     """Получить количество записей на сегодня"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
+        cursor.execute(
+            "SELECT bookings FROM stats_daily WHERE day = ? AND status = 'confirmed'",
+            (datetime.date.today().isoformat(),)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+def explain_query_plan(query: str, params: tuple = ()) -> List[str]:
+    """Получить план выполнения запроса (EXPLAIN QUERY PLAN)"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'EXPLAIN QUERY PLAN {query}', params)
+        return [row['detail'] for row in cursor.fetchall()]
+
+def _bookings_access(plan: List[str]) -> Optional[str]:
+    """Как план читает таблицу bookings (алиас b): индекс, PRIMARY KEY или None - полный просмотр"""
+    for detail in plan:
+        match = re.match(r'(?:SCAN|SEARCH) b\b(?: USING (?:COVERING )?INDEX (\w+)| USING (INTEGER PRIMARY KEY))?', detail)
+        if match:
+            return match.group(1) or match.group(2)
+    return None
+
+def verify_booking_indexes() -> Dict[str, Optional[str]]:
+    """Какой индекс bookings используют запросы списков и расчета свободного времени.
+
+    Запросы строятся так же, как в функциях, которые их выполняют (BookingQuery
+    и ACTIVE_BOOKINGS_SQL). None означает полный просмотр таблицы.
+    """
     today = datetime.date.today()
-    cursor.execute("SELECT COUNT(*) FROM bookings WHERE DATE(booking_datetime) = ? AND status = 'confirmed'", (today,))
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
\ No newline at end of file
+    bounds = day_range(today)
+    cursor_value = (bounds[0], 0)
+    queries = {
+        'pending': _booking_list_query('pending'),
+        'today': _booking_list_query('today'),
+        'pending_page': _booking_list_query('pending').after(cursor_value).limit(config.ADMIN_PAGE_SIZE + 1),
+        'week': BookingQuery().status('confirmed').period(*day_range(today, days=7)),
+        'by_date': BookingQuery().period(*bounds),
+        'by_user': BookingQuery(LIST_COLUMNS + ('created_at',)).user(0).order_by('datetime_desc'),
+        'by_status': BookingQuery().status('confirmed').order_by('datetime_desc'),
+        'all_page': BookingQuery(LIST_COLUMNS + ('created_at',)).order_by('datetime_desc')
+            .before(cursor_value).limit(100),
+        'by_id': BookingQuery(BOOKING_COLUMNS).booking(0),
+    }
+    plans = {name: query.build() for name, query in queries.items()}
+    plans['availability_range'] = (ACTIVE_BOOKINGS_SQL, day_range(today, days=15))
+
+    return {
+        name: _bookings_access(explain_query_plan(sql, params))
+        for name, (sql, params) in plans.items()
+    }
@@ -0,0 +1,115 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.async_database import load_fsm_record, save_fsm_field, delete_expired_fsm_records
+
+def _serialize(data: Mapping[str, Any]) -> str:
+    """Компактный JSON без пробелов"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в базе бота.
+
+    Каждая запись сразу попадает в базу (upsert) с новой меткой версии, поэтому
+    сессия не теряется при смене контейнера. Копия сессии держится в памяти процесса
+    и после записи или сверки с базой используется без запросов check_interval секунд.
+    Затем ее метка сверяется с меткой в базе (чтение одной строки по ключу без данных),
+    и если сессию изменил другой контейнер, она перечитывается. Сессии без действий
+    дольше state_ttl секунд удаляются не чаще раза в cleanup_interval.
+    """
+
+    def __init__(self, state_ttl: float = 24 * 3600, cleanup_interval: float = 3600,
+                 cache_size: int = 1000, check_interval: float = 5):
+        self.state_ttl = state_ttl
+        self.cleanup_interval = cleanup_interval
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        # Ключ -> (состояние, данные, метка версии, время последней сверки с базой)
+        self._cache: "OrderedDict[str, Tuple[Optional[str], str, Optional[str], float]]" = OrderedDict()
+        self._cleaned_at = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        """Строковый ключ сессии"""
+        return ':'.join(str(part) if part is not None else '' for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id,
+            key.business_connection_id, key.destiny
+        ))
+
+    def _remember(self, storage_key: str, state: Optional[str], data: str, revision: Optional[str]):
+        """Сохранить копию сессии в памяти (она только что совпала с базой)"""
+        self._cache[storage_key] = (state, data, revision, time.monotonic())
+        self._cache.move_to_end(storage_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, storage_key: str) -> Tuple[Optional[str], str]:
+        """Состояние и данные сессии: из памяти, если копия свежая или ее метка совпадает с базой"""
+        cached = self._cache.get(storage_key)
+        if cached is not None and time.monotonic() - cached[3] < self.check_interval:
+            self._cache.move_to_end(storage_key)
+            return cached[0], cached[1]
+
+        record = await load_fsm_record(storage_key, self.state_ttl, cached[2] if cached else None)
+
+        if record is None:
+            state, data, revision = None, '{}', None
+        elif record[1]:
+            state, data, revision = cached[0], cached[1], cached[2]
+        else:
+            revision, _, state, data = record
+
+        self._remember(storage_key, state, data, revision)
+        return state, data
+
+    async def _save(self, storage_key: str, field: str, value: Optional[str]):
+        """Записать поле сессии в базу и в память"""
+        previous, revision = await save_fsm_field(storage_key, field, value)
+
+        cached = self._cache.get(storage_key)
+        if cached is not None and cached[2] == previous:
+            state, data = (value, cached[1]) if field == 'state' else (cached[0], value)
+            self._remember(storage_key, state, data, revision)
+        else:
+            # Другое поле сессии изменил другой процесс - копия устарела
+            self._cache.pop(storage_key, None)
+
+        await self._cleanup()
+
+    async def _cleanup(self):
+        """Удалить брошенные сессии, если с прошлой очистки прошло достаточно времени"""
+        now = time.monotonic()
+        if now - self._cleaned_at < self.cleanup_interval:
+            return
+        self._cleaned_at = now
+
+        try:
+            await delete_expired_fsm_records(self.state_ttl)
+        except Exception as e:
+            print(f"Ошибка очистки сессий FSM: {e}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._save(self._key(key), 'state', state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        await self._save(self._key(key), 'data', _serialize(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return json.loads(data)
+
+    async def close(self) -> None:
+        # Соединения принадлежат общему пулу базы
+        self._cache.clear()
@@ -0,0 +1,137 @@
+import functools
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+def is_busy_error(error: Exception) -> bool:
+    """Проверить, что ошибка вызвана блокировкой базы другим соединением"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class ConnectionPool:
+    """Пул соединений с SQLite с повторным использованием внутри потока"""
+
+    def __init__(self, db_name: str, size: int = 5, pragmas: Optional[dict] = None,
+                 checkpoint_interval: Optional[float] = None,
+                 busy_retries: int = 0, busy_backoff: float = 0.05,
+                 cached_statements: int = 128):
+        self.db_name = db_name
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.checkpoint_interval = checkpoint_interval
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_checkpoint = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть новое соединение и применить настройки хранилища"""
+        conn = sqlite3.connect(
+            self.db_name, check_same_thread=False, cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Взять свободное соединение или открыть новое, если пул не заполнен"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if not can_create:
+            # Все соединения заняты - ждем, пока какое-нибудь освободится
+            return self._idle.get()
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _maybe_checkpoint(self, conn: sqlite3.Connection):
+        """Периодически переносить журнал WAL в основной файл базы"""
+        if not self.checkpoint_interval:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_checkpoint < self.checkpoint_interval:
+                return
+            self._last_checkpoint = now
+        # PASSIVE не ждет читателей и писателей, поэтому не блокирует запросы
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Получить соединение из пула.
+
+        Вложенные вызовы в том же потоке получают то же соединение,
+        фиксация или откат транзакции выполняются на внешнем уровне.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+            self._maybe_checkpoint(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._idle.put(conn)
+
+    def retry_on_busy(self, func):
+        """Декоратор: повторить транзакцию с нарастающей паузой, если база занята"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Внутри чужой транзакции повторять нельзя - решает внешний уровень
+            if getattr(self._local, 'conn', None) is not None:
+                return func(*args, **kwargs)
+
+            delay = self.busy_backoff
+            for attempt in range(self.busy_retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if attempt == self.busy_retries or not is_busy_error(e):
+                        raise
+                    time.sleep(delay + random.uniform(0, delay))
+                    delay *= 2
+        return wrapper
+
+    def close(self):
+        """Закрыть все свободные соединения"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,12 @@
+from typing import Optional
+
+from aiogram.filters import BaseFilter
+from aiogram.types import TelegramObject, User
+
+from database.async_database import is_admin
+
+class IsAdmin(BaseFilter):
+    """Фильтр: событие от администратора (проверка по набору в памяти)"""
+
+    async def __call__(self, event: TelegramObject, event_from_user: Optional[User] = None) -> bool:
+        return event_from_user is not None and await is_admin(event_from_user.id)
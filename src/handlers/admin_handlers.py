@@ -1,32 +1,44 @@
 # handlers/admin_handlers.py
 from aiogram import Router, types, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
-from database.database import (
-    is_admin, add_admin,  get_pending_bookings, update_booking_status,
-    get_today_bookings, get_tomorrow_bookings, 
-    get_statistics, get_clients_for_notification
+from database.async_database import (
+    add_admin, update_booking_status, get_bookings_page, search_bookings,
+    get_statistics, verify_statistics, rebuild_statistics, get_period_report,
+    verify_booking_indexes,
+    get_clients_for_notification, get_booking_by_id,
+    create_broadcast_job, get_broadcast_job, set_broadcast_progress_message
 )
 from keyboards.admin_keyboard import (
-    get_admin_main_keyboard, get_admin_booking_actions_keyboard,
-    get_notification_groups_keyboard, get_reschedule_times_keyboard
+    get_admin_main_keyboard,
+    get_notification_groups_keyboard, get_reschedule_times_keyboard,
+    get_bookings_page_keyboard
 )
+from filters.admin_filter import IsAdmin
+from middlewares.admin_middleware import AdminAccessMiddleware
 from states.admin_states import AdminStates
-from config import ADMIN_PASSWORD
+from utils.reminder_scheduler import ReminderScheduler
+from utils.availability_cache import availability_cache
+from utils.broadcast import BroadcastEngine, format_broadcast_progress
+from config import ADMIN_PASSWORD, ADMIN_PAGE_SIZE, ADMIN_SEARCH_LIMIT
 import datetime
+import html
 
 router = Router()
+# Все кнопки админ-панели доступны только администраторам
+router.callback_query.middleware(AdminAccessMiddleware())
+
+@router.message(Command("admin"), IsAdmin())
+async def admin_command_handler(message: Message):
+    """Обработчик команды /admin для администратора"""
+    await show_admin_panel(message)
 
 @router.message(Command("admin"))
-async def admin_command_handler(message: Message, state: FSMContext):
-    """Обработчик команды /admin"""
-    # Если уже администратор
-    if is_admin(message.from_user.id):
-        await show_admin_panel(message)
-        return
-    
+async def admin_login_handler(message: Message, state: FSMContext):
+    """Обработчик команды /admin: вход по паролю"""
     # Запрашиваем пароль
     await message.answer("🔐 *Вход в админ-панель*\n\nВведите пароль:", parse_mode="HTML")
     await state.set_state(AdminStates.waiting_password)
@@ -36,7 +48,7 @@ async def check_admin_password_handler(message: Message, state: FSMContext):
     """Проверка пароля администратора"""
     if message.text == ADMIN_PASSWORD:
         # Добавляем администратора
-        add_admin(message.from_user.id)
+        await add_admin(message.from_user.id)
         
         await message.answer("✅ *Доступ предоставлен!*", parse_mode="HTML")
         await show_admin_panel(message)
@@ -55,140 +67,214 @@ async def show_admin_panel(message: Message):
 @router.callback_query(F.data == "admin_panel")
 async def admin_panel_callback_handler(callback: CallbackQuery):
     """Обработчик кнопки админ-панели"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
-        return
-    
     await callback.answer()
     await show_admin_panel(callback.message)
 
-@router.callback_query(F.data == "admin_pending")
-async def admin_pending_handler(callback: CallbackQuery):
-    """Показать ожидающие записи"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
-        return
-    
+# Списки записей показываются постранично в одном сообщении
+BOOKING_LISTS = {
+    'pending': ("⏳ Записи, ожидающие подтверждения", "✅ Нет записей, ожидающих подтверждения."),
+    'today': ("📅 Записи на сегодня", "✅ Нет записей, на сегодня."),
+    'tomorrow': ("📆 Записи на завтра", "✅ Нет записей, на завтра."),
+}
+
+def _encode_cursor(booking) -> str:
+    """Курсор записи для callback_data: время без разделителей и ID"""
+    digits = ''.join(ch for ch in booking['booking_datetime'] if ch.isdigit())
+    return f"{digits}_{booking['booking_id']}"
+
+def _decode_cursor(digits: str, booking_id: str):
+    """Курсор (booking_datetime, booking_id) из callback_data"""
+    booking_datetime = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+    return booking_datetime, int(booking_id)
+
+def _format_booking(booking, with_status: bool = False) -> str:
+    """Карточка записи для списков администратора"""
+    text = (
+        f"⏳ Запись #{booking['booking_id']}\n"
+        f" № TG: @{html.escape(booking['username'] or '')}\n"
+        f"👤 Клиент: {html.escape(booking['first_name'] or '')}\n"
+        f"💅 Услуга: {booking['service_name']}\n"
+        f"💰 Цена: {booking['price']}₽\n"
+        f"📅 Дата: {booking['booking_datetime'][:10]}\n"
+        f"⏰ Время: {booking['booking_datetime'][11:16]}"
+    )
+    if with_status:
+        text += f"\n📌 Статус: {booking['status']}"
+    return text
+
+async def _render_bookings_page(list_name: str, after=None, before=None):
+    """Текст и клавиатура страницы списка записей"""
+    title, empty_text = BOOKING_LISTS[list_name]
+    bookings, has_prev, has_next = await get_bookings_page(
+        list_name, ADMIN_PAGE_SIZE, after=after, before=before
+    )
+
+    if not bookings:
+        return empty_text, get_bookings_page_keyboard(())
+
+    text = f"{title}\n\n" + "\n\n".join(_format_booking(booking) for booking in bookings)
+
+    prev_data = f"bpage_{list_name}_p_{_encode_cursor(bookings[0])}" if has_prev else None
+    next_data = f"bpage_{list_name}_n_{_encode_cursor(bookings[-1])}" if has_next else None
+    action_ids = [booking['booking_id'] for booking in bookings] if list_name == 'pending' else []
+
+    return text, get_bookings_page_keyboard(action_ids, prev_data, next_data)
+
+@router.callback_query(F.data.in_({"admin_pending", "admin_today", "admin_tomorrow"}))
+async def admin_bookings_list_handler(callback: CallbackQuery):
+    """Показать первую страницу списка записей"""
+    await callback.answer()
+
+    list_name = callback.data.split("_")[1]
+    text, keyboard = await _render_bookings_page(list_name)
+
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+@router.callback_query(F.data.startswith("bpage_"))
+async def admin_bookings_page_handler(callback: CallbackQuery):
+    """Перелистнуть список записей в том же сообщении"""
     await callback.answer()
+
+    _, list_name, direction, digits, booking_id = callback.data.split("_")
+    cursor = _decode_cursor(digits, booking_id)
+
+    if direction == "n":
+        text, keyboard = await _render_bookings_page(list_name, after=cursor)
+    else:
+        text, keyboard = await _render_bookings_page(list_name, before=cursor)
+
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest as e:
+        # Страница не изменилась (например, двойное нажатие)
+        print(f"Ошибка обновления списка записей: {e}")
+
+@router.message(Command("search"), IsAdmin())
+async def admin_search_handler(message: Message, command: CommandObject):
+    """Поиск записей по имени клиента, username или услуге: /search <текст>"""
+    search_term = (command.args or "").strip()
+    if not search_term:
+        await message.answer("🔎 Использование: /search <имя, username или услуга>")
+        return
     
-    bookings = get_pending_bookings()
+    bookings = await search_bookings(search_term, limit=ADMIN_SEARCH_LIMIT)
     
     if not bookings:
-        await callback.message.answer("✅ Нет записей, ожидающих подтверждения.")
-        return
-    
-    for booking in bookings:
-        text = (
-            f"⏳ Запись #{booking['booking_id']}\n\n"
-            f" № TG: @{booking['username']}\n"
-            f"👤 Клиент: {booking['first_name']}\n"
-            f"💅 Услуга: {booking['service_name']}\n"
-            f"💰 Цена: {booking['price']}₽\n"
-            f"📅 Дата: {booking['booking_datetime'][:10]}\n"
-            f"⏰ Время: {booking['booking_datetime'][11:16]}\n"
-        )
-        
-        await callback.message.answer(
-            text,
-            reply_markup=get_admin_booking_actions_keyboard(
-                booking['booking_id'], 
-                booking['user_id']
-            ),
-            parse_mode="HTML"
-        )
-
-
-@router.callback_query(F.data == "admin_today")
-async def admin_today_handler(callback: CallbackQuery):
-    """Показать записи на сегодня"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
+        await message.answer(f"🔎 По запросу «{html.escape(search_term)}» ничего не найдено.", parse_mode="HTML")
         return
     
+    text = (
+        f"🔎 Найдено по запросу «{html.escape(search_term)}»: {len(bookings)}\n\n"
+        + "\n\n".join(_format_booking(booking, with_status=True) for booking in bookings)
+    )
+    await message.answer(text, parse_mode="HTML")
+
+@router.callback_query(F.data == "admin_stats")
+async def admin_stats_handler(callback: CallbackQuery):
+    """Показать статистику"""
     await callback.answer()
     
-    bookings = get_today_bookings()
+    stats = await get_statistics()
+    cache = availability_cache.stats()
     
-    if not bookings:
-        await callback.message.answer("✅ Нет записей, на сегодня.")
+    text = (
+        "📊 Статистика\n\n"
+        f"✅ Подтвержденных записей: {stats['confirmed']}\n"
+        f"⏳ Ожидают подтверждения: {stats['pending']}\n"
+        f"📅 Записей на сегодня: {stats['today']}\n"
+        f"💰 Выручка: {stats['revenue']}₽\n"
+        f"👥 Клиентов: {stats['unique_clients']}\n"
+        f"👤 Пользователей бота: {stats['total_users']}\n\n"
+        f"⚡ Кэш свободного времени: {cache['hit_rate']:.0%} попаданий "
+        f"({cache['hits']} из {cache['hits'] + cache['misses']}), "
+        f"заполнен {cache['size']} из {cache['max_size']}"
+    )
+    await callback.message.answer(text)
+
+@router.message(Command("stats_verify"), IsAdmin())
+async def admin_stats_verify_handler(message: Message):
+    """Сверить счетчики статистики с записями"""
+    mismatches = await verify_statistics()
+    
+    if not mismatches:
+        await message.answer("✅ Счетчики статистики совпадают с записями.")
         return
     
-    for booking in bookings:
-        text = (
-            f"⏳ Запись #{booking['booking_id']}\n\n"
-            f" № TG: @{booking['username']}\n"
-            f"👤 Клиент: {booking['first_name']}\n"
-            f"💅 Услуга: {booking['service_name']}\n"
-            f"💰 Цена: {booking['price']}₽\n"
-            f"📅 Дата: {booking['booking_datetime'][:10]}\n"
-            f"⏰ Время: {booking['booking_datetime'][11:16]}\n"
-        )
-        
-        await callback.message.answer(
-            text,
-            parse_mode="HTML"
-        )
-
-@router.callback_query(F.data == "admin_tomorrow")
-async def admin_today_handler(callback: CallbackQuery):
-    """Показать записи на завтра"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
+    text = f"⚠️ Расхождений: {len(mismatches)}\n\n" + "\n".join(mismatches[:20])
+    await message.answer(f"{html.escape(text)}\n\nПересчитать: /stats_rebuild", parse_mode="HTML")
+
+@router.message(Command("stats_rebuild"), IsAdmin())
+async def admin_stats_rebuild_handler(message: Message):
+    """Пересчитать счетчики статистики с нуля"""
+    await rebuild_statistics()
+    await message.answer("✅ Счетчики статистики пересчитаны.")
+
+# Периоды отчета: название и первый день периода
+REPORT_PERIODS = {
+    'week': ("неделю", lambda today: today - datetime.timedelta(days=today.weekday())),
+    'month': ("месяц", lambda today: today.replace(day=1)),
+}
+
+@router.message(Command("report"), IsAdmin())
+async def admin_report_handler(message: Message, command: CommandObject):
+    """Отчет за текущую неделю или месяц: /report week|month"""
+    period = (command.args or "week").strip().lower()
+    if period not in REPORT_PERIODS:
+        await message.answer("📈 Использование: /report week или /report month")
         return
     
-    await callback.answer()
+    title, period_start = REPORT_PERIODS[period]
+    today = datetime.date.today()
+    start_date = period_start(today)
+    report = await get_period_report(start_date, (today - start_date).days + 1)
     
-    bookings = get_tomorrow_bookings()
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(report['status_counts'].items()))
+    services = sorted(report['services'].items(), key=lambda item: item[1]['revenue'], reverse=True)
     
-    if not bookings:
-        await callback.message.answer("✅ Нет записей, на завтра.")
-        return
+    text = (
+        f"📈 Отчет за {title} ({report['start']} — {report['end']})\n\n"
+        f"📋 Записей: {report['total_count']}" + (f" ({statuses})" if statuses else "") + "\n"
+        f"💰 Выручка: {report['revenue']}₽\n"
+        f"👥 Клиентов: {report['unique_clients']}\n"
+    )
     
-    for booking in bookings:
-        text = (
-            f"⏳ Запись #{booking['booking_id']}\n\n"
-            f" № TG: @{booking['username']}\n"
-            f"👤 Клиент: {booking['first_name']}\n"
-            f"💅 Услуга: {booking['service_name']}\n"
-            f"💰 Цена: {booking['price']}₽\n"
-            f"📅 Дата: {booking['booking_datetime'][:10]}\n"
-            f"⏰ Время: {booking['booking_datetime'][11:16]}\n"
-        )
-        
-        await callback.message.answer(
-            text,
-            parse_mode="HTML"
-        )
+    if services:
+        text += "\n💅 Услуги:\n" + "\n".join(
+            f"• {html.escape(name)}: {service['bookings']} зап., {service['revenue']}₽"
+            for name, service in services
+        ) + "\n"
+    
+    text += "\n📅 По дням:\n" + "\n".join(
+        f"{day['date'][5:]}: {day['total_count']} зап., {day['daily_revenue']}₽"
+        for day in report['days']
+    )
+    await message.answer(text, parse_mode="HTML")
+
+@router.message(Command("db_indexes"), IsAdmin())
+async def admin_db_indexes_handler(message: Message):
+    """Показать, какие индексы используют запросы к записям"""
+    access = await verify_booking_indexes()
+    
+    lines = [
+        f"{'✅' if index else '⚠️'} {name}: {index or 'полный просмотр таблицы'}"
+        for name, index in access.items()
+    ]
+    await message.answer("🗂 Индексы запросов к записям\n\n" + "\n".join(lines))
 
 @router.callback_query(F.data.startswith("admin_confirm_"))
-async def admin_confirm_handler(callback: CallbackQuery, bot):
+async def admin_confirm_handler(callback: CallbackQuery, bot, reminder_scheduler: ReminderScheduler = None):
     """Подтвердить запись"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
-        return
-    
     await callback.answer()
     
     booking_id = int(callback.data.split("_")[2])
     
     # Обновляем статус
-    update_booking_status(booking_id, 'confirmed')
+    await update_booking_status(booking_id, 'confirmed')
+    if reminder_scheduler:
+        reminder_scheduler.wake()
     
     # Уведомляем клиента
-    from database.database import get_db_connection
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT b.user_id, u.first_name, s.name, b.booking_datetime, s.duration_minutes, s.price
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.booking_id = ?
-    ''', (booking_id,))
-    
-    booking = cursor.fetchone()
-    conn.close()
+    booking = await get_booking_by_id(booking_id)
     
     if booking:
         dt = datetime.datetime.strptime(booking['booking_datetime'], '%Y-%m-%d %H:%M:%S')
@@ -198,7 +284,7 @@ async def admin_confirm_handler(callback: CallbackQuery, bot):
             await bot.send_message(
                 chat_id=booking['user_id'],
                 text=f"🎉 Ваша запись подтверждена!\n\n"
-                     f"💅 Услуга: {booking['name']}\n"
+                     f"💅 Услуга: {booking['service_name']}\n"
                      f"📅 Дата: {dt.strftime('%d.%m.%Y')}\n"
                      f"⏰ Время: {dt.strftime('%H:%M')} - {end_time.strftime('%H:%M')}\n"
                      f"💰 Стоимость: {booking['price']}₽\n\n"
@@ -215,34 +301,19 @@ async def admin_confirm_handler(callback: CallbackQuery, bot):
     await callback.message.answer(f"✅ Запись #{booking_id} подтверждена.\n главное меню админа: /admin")
 
 @router.callback_query(F.data.startswith("admin_reject_"))
-async def admin_reject_handler(callback: CallbackQuery, bot):
+async def admin_reject_handler(callback: CallbackQuery, bot, reminder_scheduler: ReminderScheduler = None):
     """Отменить запись"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("Доступ запрещен", show_alert=True)
-        return
-    
     await callback.answer()
     
     booking_id = int(callback.data.split("_")[2])
     
     # Обновляем статус
-    update_booking_status(booking_id, 'cancelled')
+    await update_booking_status(booking_id, 'cancelled')
+    if reminder_scheduler:
+        reminder_scheduler.wake()
     
     # Уведомляем клиента
-    from database.database import get_db_connection
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT b.user_id, u.first_name, s.name, b.booking_datetime, s.duration_minutes, s.price
-        FROM bookings b
-        JOIN users u ON b.user_id = u.user_id
-        JOIN services s ON b.service_id = s.service_id
-        WHERE b.booking_id = ?
-    ''', (booking_id,))
-    
-    booking = cursor.fetchone()
-    conn.close()
+    booking = await get_booking_by_id(booking_id)
     
     if booking:
         dt = datetime.datetime.strptime(booking['booking_datetime'], '%Y-%m-%d %H:%M:%S')
@@ -252,7 +323,7 @@ async def admin_reject_handler(callback: CallbackQuery, bot):
             await bot.send_message(
                 chat_id=booking['user_id'],
                 text=f"❌ Ваша запись отменена\n\n"
-                     f"💅 Услуга: {booking['name']}\n"
+                     f"💅 Услуга: {booking['service_name']}\n"
                      f"📅 Дата: {dt.strftime('%d.%m.%Y')}\n"
                      f"⏰ Время: {dt.strftime('%H:%M')} - {end_time.strftime('%H:%M')}\n"
                      f"💰 Стоимость: {booking['price']}₽\n\n"
@@ -268,5 +339,41 @@ async def admin_reject_handler(callback: CallbackQuery, bot):
     
     await callback.message.answer(f"❌ Запись #{booking_id} отменена.\nГлавное меню админа: /admin")
 
+@router.callback_query(F.data == "admin_notify")
+async def admin_notify_handler(callback: CallbackQuery):
+    """Выбор группы клиентов для уведомления"""
+    await callback.answer()
+    
+    await callback.message.answer(
+        "📢 *Уведомления*\n\nВыберите, кому отправить сообщение:",
+        reply_markup=get_notification_groups_keyboard(),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data.in_({"notify_all", "notify_today", "notify_tomorrow"}))
+async def notify_group_handler(callback: CallbackQuery, state: FSMContext):
+    """Запросить текст уведомления для выбранной группы"""
+    await callback.answer()
+    
+    await state.update_data(notify_group=callback.data.split("_")[1])
+    await state.set_state(AdminStates.sending_notification)
+    
+    await callback.message.answer("✏️ Введите текст уведомления:")
+
+@router.message(AdminStates.sending_notification, IsAdmin())
+async def send_notification_handler(message: Message, state: FSMContext, broadcasts: BroadcastEngine):
+    """Создать рассылку и запустить ее"""
+    data = await state.get_data()
+    await state.clear()
+    
+    job_id = await create_broadcast_job(data.get('notify_group', 'all'), message.html_text, message.chat.id)
+    job = await get_broadcast_job(job_id)
+    
+    # Ход рассылки обновляется в этом сообщении
+    progress = await message.answer(format_broadcast_progress(job))
+    await set_broadcast_progress_message(job_id, progress.message_id)
+    
+    broadcasts.start(job_id)
+
 # ... (другие обработчики администратора)
 
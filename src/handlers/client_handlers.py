@@ -1,19 +1,23 @@
 import datetime
+import uuid
 from aiogram import Router, types, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 
-from database.database import (
-    save_user, get_services, create_booking, get_user_bookings
+from database.async_database import (
+    save_user, get_services, get_service_by_id, create_booking, get_user_bookings,
+    get_booking_id_by_idempotency_key,
+    get_available_slots_by_date, get_available_time_slots, is_slot_available, is_admin
 )
 from keyboards.client_keyboard import (
     get_main_menu_keyboard, get_services_keyboard,
     get_dates_keyboard, get_times_keyboard, get_confirmation_keyboard
 )
 from states.booking_states import BookingStates
-from utils.schedule_utils import get_available_dates_with_slots, get_available_time_slots
 from utils.notification_utils import notify_admins_about_new_booking
+from utils.message_sender import MessageSender
+from utils.background_tasks import spawn
 from utils.helpers import calculate_end_time
 
 router = Router()
@@ -22,7 +26,7 @@ router = Router()
 async def start_handler(message: Message):
     """Обработчик команды /start"""
     # Сохраняем пользователя
-    save_user(
+    await save_user(
         user_id=message.from_user.id,
         username=message.from_user.username,
         first_name=message.from_user.first_name,
@@ -30,8 +34,7 @@ async def start_handler(message: Message):
     )
     
     # Проверяем, администратор ли
-    from database.database import is_admin
-    admin = is_admin(message.from_user.id)
+    admin = await is_admin(message.from_user.id)
     
     # Отправляем приветствие
     await message.answer(
@@ -46,7 +49,7 @@ async def record_handler(callback: CallbackQuery, state: FSMContext):
     """Начать процесс записи"""
     await callback.answer()
     
-    services = get_services()
+    services = await get_services()
     await callback.message.answer(
         "Выбери, какой штрих сделает тебя безупречной: 👇",
         reply_markup=get_services_keyboard(services),
@@ -62,8 +65,7 @@ async def select_service_handler(callback: CallbackQuery, state: FSMContext):
     
     service_id = int(callback.data.split("_")[1])
     
-    from database.database import get_service_by_id
-    service = get_service_by_id(service_id)
+    service = await get_service_by_id(service_id)
     
     if not service:
         await callback.message.answer("Услуга не найдена")
@@ -77,10 +79,10 @@ async def select_service_handler(callback: CallbackQuery, state: FSMContext):
         service_duration=service['duration_minutes']
     )
     
-    # Получаем доступные даты
-    available_dates = get_available_dates_with_slots(service['duration_minutes'])
+    # Получаем свободное время сразу на все даты
+    available_slots = await get_available_slots_by_date(service['duration_minutes'])
     
-    if not available_dates:
+    if not available_slots:
         await callback.message.answer(
             "😔 На ближайшие две недели нет свободных дат для этой услуги."
         )
@@ -92,7 +94,7 @@ async def select_service_handler(callback: CallbackQuery, state: FSMContext):
         f"💰 *Цена:* {service['price']}₽\n"
         f"⏱ *Длительность:* {service['duration_minutes']} мин\n\n"
         "📅 *Выберите дату:*",
-        reply_markup=get_dates_keyboard(available_dates),
+        reply_markup=get_dates_keyboard(list(available_slots)),
         parse_mode="HTML"
     )
     
@@ -112,8 +114,8 @@ async def select_date_handler(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     duration = data.get('service_duration', 60)
     
-    # Получаем доступное время
-    available_times = get_available_time_slots(date_str, duration)
+    # Получаем доступное время (расчет при выборе услуги уже в кэше свободного времени)
+    available_times = await get_available_time_slots(date_str, duration)
     
     if not available_times:
         date_obj = datetime.datetime.strptime(date_str, '%Y-%m-%d').date()
@@ -161,16 +163,18 @@ async def select_time_handler(callback: CallbackQuery, state: FSMContext):
         parse_mode="HTML"
     )
     
-    # Сохраняем время
+    # Сохраняем время и ключ идемпотентности: повторное подтверждение
+    # этой же записи не создаст дубль
     await state.update_data(
         selected_time=time_str,
-        booking_datetime=booking_datetime
+        booking_datetime=booking_datetime,
+        booking_key=uuid.uuid4().hex
     )
     
     await state.set_state(BookingStates.confirming)
 
 @router.callback_query(F.data == "confirm_booking", BookingStates.confirming)
-async def confirm_booking_handler(callback: CallbackQuery, state: FSMContext, bot):
+async def confirm_booking_handler(callback: CallbackQuery, state: FSMContext, sender: MessageSender):
     """Подтвердить запись"""
     await callback.answer()
     
@@ -183,22 +187,28 @@ async def confirm_booking_handler(callback: CallbackQuery, state: FSMContext, bo
     service_price = data.get('service_price')
     service_duration = data.get('service_duration')
     booking_datetime = data.get('booking_datetime')
+    booking_key = data.get('booking_key')
+    
+    # Запись по этой сессии уже создана (повтор или двойное нажатие)
+    existing_id = await get_booking_id_by_idempotency_key(booking_key) if booking_key else None
+    if existing_id:
+        await callback.message.answer(f"✅ Запись #{existing_id} уже оформлена.")
+        await state.clear()
+        return
+    
+    # Слот могли закрыть в расписании, пока клиент подтверждал запись - сверяемся с базой.
+    # Пересечение с другими записями create_booking проверяет в одной транзакции со вставкой
+    if not await is_slot_available(booking_datetime[:10], booking_datetime[11:16], service_duration):
+        await callback.message.answer(
+            "😔 Это время уже недоступно. Для новой записи нажмите /start"
+        )
+        await state.clear()
+        return
     
     # Создаем запись
-    success, message, booking_id = create_booking(user_id, service_id, booking_datetime)
+    success, message, booking_id = await create_booking(user_id, service_id, booking_datetime, booking_key)
     
     if success:
-        # Уведомляем администраторов
-        user_info = {
-            'first_name': callback.from_user.first_name,
-            'username': callback.from_user.username
-        }
-        
-        await notify_admins_about_new_booking(
-            bot, booking_id, id_user, user_info, service_name, 
-            booking_datetime, service_duration, service_price
-        )
-        
         # Формируем ответ
         dt = datetime.datetime.strptime(booking_datetime, '%Y-%m-%d %H:%M:%S')
         end_time = calculate_end_time(booking_datetime, service_duration)
@@ -213,6 +223,20 @@ async def confirm_booking_handler(callback: CallbackQuery, state: FSMContext, bo
             "💖 Ждем вас в салоне!",
             parse_mode="HTML"
         )
+        
+        # Уведомляем администраторов в фоне, клиент их не ждет
+        user_info = {
+            'first_name': callback.from_user.first_name,
+            'username': callback.from_user.username
+        }
+        
+        spawn(notify_admins_about_new_booking(
+            sender, booking_id, id_user, user_info, service_name, 
+            booking_datetime, service_duration, service_price
+        ))
+    elif booking_id:
+        # Параллельный повтор успел создать запись раньше
+        await callback.message.answer(f"✅ Запись #{booking_id} уже оформлена.")
     else:
         await callback.message.answer(
             f"😔 *Ошибка:* {message}",
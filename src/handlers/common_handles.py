@@ -2,9 +2,11 @@
 from aiogram import Router, types, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
+from database.async_database import get_services
 from keyboards.client_keyboard import (
     get_main_menu_keyboard, get_back_to_start_keyboard
     )
+from utils.helpers import format_duration
 
 router = Router()
 
@@ -13,19 +15,16 @@ async def services_handler(callback: CallbackQuery):
     """Показать услуги"""
     await callback.answer()
     
+    services = await get_services()
+    
+    lines = [
+        f"{number}. {service['name']} - {service['price']}₽ ({format_duration(service['duration_minutes'])})"
+        for number, service in enumerate(services, start=1)
+    ]
     services_text = (
         "💅 Выбери, чего не хаватает чтобы стать безупречной:\n\n"
-        "1. Дизайн ногтей - 150₽ (10 мин)\n"
-        "2. Комбинированный маникюр - 1500₽ (45 мин)\n"
-        "3. Мужской маникюр - 2000₽ (1 час)\n"
-        "4. Маникюр с покрытием гель-лаком - от 5000₽ (2 часа)\n"
-        "5. Наращивание ногтей - 7500₽ (3-4 часа)\n"
-        "6. Японский маникюр - 2500₽ (1 час)\n"
-        "7. Педикюр с покрытием гель-лаком - 5000₽ (2часа)\n"
-        "8. Снятие гель-лака - 1000₽ (30 мин)\n"
-        "9. Обработка сложного участка - 1500₽ (20 мин)\n"
-        "10. Маникюр с покрытием гелем - 4000₽ (2 час)\n\n"
-        "💖 Каждая услуга выполняется с любовью и профессионализмом!"
+        + "\n".join(lines)
+        + "\n\n💖 Каждая услуга выполняется с любовью и профессионализмом!"
     )
     
     await callback.message.answer(services_text, reply_markup=get_back_to_start_keyboard(), parse_mode="HTML")
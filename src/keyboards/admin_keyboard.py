@@ -1,6 +1,13 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+import config
+
+# Клавиатуры строятся один раз и переиспользуются, поэтому возвращаемые
+# объекты нельзя изменять - только отправлять
+
+@lru_cache(maxsize=None)
 def get_admin_main_keyboard() -> InlineKeyboardMarkup:
     """Главное меню администратора"""
     builder = InlineKeyboardBuilder()
@@ -25,7 +32,7 @@ def get_admin_main_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 def get_admin_booking_actions_keyboard(booking_id: int, user_id: int) -> InlineKeyboardMarkup:
-    """Действия с записью для администратора"""
+    """Действия с записью для администратора (не кэшируется: ID записи каждый раз новый)"""
     builder = InlineKeyboardBuilder()
     
     builder.row(
@@ -39,6 +46,7 @@ def get_admin_booking_actions_keyboard(booking_id: int, user_id: int) -> InlineK
     
     return builder.as_markup()
 
+@lru_cache(maxsize=None)
 def get_notification_groups_keyboard() -> InlineKeyboardMarkup:
     """Группы для уведомлений"""
     builder = InlineKeyboardBuilder()
@@ -52,6 +60,11 @@ def get_notification_groups_keyboard() -> InlineKeyboardMarkup:
 
 def get_reschedule_times_keyboard(times, booking_id: int, date_str: str) -> InlineKeyboardMarkup:
     """Время для переноса записи"""
+    return _build_reschedule_times_keyboard(tuple(times), booking_id, date_str)
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def _build_reschedule_times_keyboard(times, booking_id: int, date_str: str) -> InlineKeyboardMarkup:
+    """Построить клавиатуру времени для переноса записи"""
     builder = InlineKeyboardBuilder()
     
     for time_str in times:
@@ -65,3 +78,30 @@ def get_reschedule_times_keyboard(times, booking_id: int, date_str: str) -> Inli
     
     return builder.as_markup()
 
+
+def get_bookings_page_keyboard(action_ids, prev_data: str = None, next_data: str = None) -> InlineKeyboardMarkup:
+    """Страница списка записей: действия с записями и листание"""
+    return _build_bookings_page_keyboard(tuple(action_ids), prev_data, next_data)
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def _build_bookings_page_keyboard(action_ids, prev_data: str, next_data: str) -> InlineKeyboardMarkup:
+    """Построить клавиатуру страницы списка записей"""
+    builder = InlineKeyboardBuilder()
+    
+    for booking_id in action_ids:
+        builder.row(
+            InlineKeyboardButton(text=f"✅ #{booking_id}", callback_data=f"admin_confirm_{booking_id}"),
+            InlineKeyboardButton(text=f"❌ #{booking_id}", callback_data=f"admin_reject_{booking_id}")
+        )
+    
+    navigation = []
+    if prev_data:
+        navigation.append(InlineKeyboardButton(text="◀️ Назад", callback_data=prev_data))
+    if next_data:
+        navigation.append(InlineKeyboardButton(text="Вперед ▶️", callback_data=next_data))
+    if navigation:
+        builder.row(*navigation)
+    
+    builder.row(InlineKeyboardButton(text="👑 Админ-панель", callback_data="admin_panel"))
+    
+    return builder.as_markup()
@@ -1,7 +1,14 @@
 import datetime
+from functools import lru_cache
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+import config
+
+# Клавиатуры строятся один раз и переиспользуются, поэтому возвращаемые
+# объекты нельзя изменять - только отправлять
+
+@lru_cache(maxsize=None)
 def get_main_menu_keyboard(is_admin: bool = False) -> InlineKeyboardMarkup:
     """Главное меню"""
     builder = InlineKeyboardBuilder()
@@ -24,21 +31,26 @@ def get_main_menu_keyboard(is_admin: bool = False) -> InlineKeyboardMarkup:
 
 def get_services_keyboard(services) -> InlineKeyboardMarkup:
     """Клавиатура с услугами"""
+    return _build_services_keyboard(
+        tuple((service['service_id'], service['name'], service['price']) for service in services)
+    )
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def _build_services_keyboard(services) -> InlineKeyboardMarkup:
+    """Построить клавиатуру услуг по кортежу (service_id, name, price)"""
     builder = InlineKeyboardBuilder()
     seen_names = set()
     
-    for service in services:
-        service_name = service['name']
-        
+    for service_id, service_name, price in services:
         if service_name in seen_names:
             continue
             
         seen_names.add(service_name)
         
-        button_text = f"{service_name} - {service['price']}₽"
+        button_text = f"{service_name} - {price}₽"
         builder.row(InlineKeyboardButton(
             text=button_text,
-            callback_data=f"service_{service['service_id']}"
+            callback_data=f"service_{service_id}"
         ))
     
     return builder.as_markup()
@@ -46,6 +58,11 @@ def get_services_keyboard(services) -> InlineKeyboardMarkup:
 
 def get_dates_keyboard(dates) -> InlineKeyboardMarkup:
     """Клавиатура с датами"""
+    return _build_dates_keyboard(tuple(dates))
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def _build_dates_keyboard(dates) -> InlineKeyboardMarkup:
+    """Построить клавиатуру с датами"""
     builder = InlineKeyboardBuilder()
     
     for date_str in dates:
@@ -68,6 +85,11 @@ def get_dates_keyboard(dates) -> InlineKeyboardMarkup:
 
 def get_times_keyboard(times) -> InlineKeyboardMarkup:
     """Клавиатура со временем"""
+    return _build_times_keyboard(tuple(times))
+
+@lru_cache(maxsize=config.KEYBOARD_CACHE_SIZE)
+def _build_times_keyboard(times) -> InlineKeyboardMarkup:
+    """Построить клавиатуру со временем"""
     builder = InlineKeyboardBuilder()
     
     for time_str in times:
@@ -79,6 +101,7 @@ def get_times_keyboard(times) -> InlineKeyboardMarkup:
     builder.adjust(3)
     return builder.as_markup()
 
+@lru_cache(maxsize=None)
 def get_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура подтверждения записи"""
     builder = InlineKeyboardBuilder()
@@ -95,6 +118,7 @@ def get_weekday_name(weekday: int) -> str:
     days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
     return days[weekday]
 
+@lru_cache(maxsize=None)
 def get_back_to_start_keyboard() -> InlineKeyboardMarkup:
     """Главное меню"""
     builder = InlineKeyboardBuilder()
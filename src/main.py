@@ -1,14 +1,21 @@
 import asyncio
 import json
+import signal
+import time
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Update
 from contextlib import asynccontextmanager
 
 import config as config
-from database.database import init_db
-from utils.schedule_utils import init_schedule
-from utils.notification_utils import send_daily_reminders
+from database.database import init_db, load_admins, verify_booking_indexes
+from database.fsm_storage import SQLiteStorage
+from middlewares.update_scheduler import ChatEventIsolation, UpdateSchedulerMiddleware
+from utils.message_sender import MessageSender
+from utils.reminder_scheduler import ReminderScheduler
+from utils.broadcast import BroadcastEngine
+from utils.background_tasks import drain
+from utils.update_dedup import UpdateDeduplicator
+from utils.webhook_server import WebhookServer
 
 # Импортируем обработчики
 from handlers.common_handles import router as common_router
@@ -18,38 +25,112 @@ from handlers.admin_handlers import router as admin_router
 # Глобальные переменные (для serverless)
 bot = None
 dp = None
+sender = None
+reminder_scheduler = None
+broadcasts = None
+deduplicator = None
 
-async def init_bot():
-    """Инициализация бота и диспетчера"""
-    global bot, dp
+async def init_bot(serverless: bool = False):
+    """Инициализация бота и диспетчера (serverless - без фоновых задач напоминаний и рассылок)"""
+    global bot, dp, sender, reminder_scheduler, broadcasts, deduplicator
     
     if bot is None or dp is None:
+        started_at = time.perf_counter()
+        
         # Инициализация базы данных
-        init_db()
-        init_schedule(days_ahead=30)
+        schema_created = init_db()
+        db_ready_at = time.perf_counter()
+        if schema_created:
+            # После миграций проверяем, что запросы к записям не просматривают всю таблицу
+            full_scans = [name for name, index in verify_booking_indexes().items() if index is None]
+            if full_scans:
+                print(f"⚠️ Запросы без индекса: {', '.join(full_scans)}")
+        load_admins()
         
         # Инициализация бота
         bot = Bot(token=config.TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
+        sender = MessageSender(
+            bot,
+            rate=config.SEND_RATE_PER_SECOND,
+            burst=config.SEND_BURST,
+            per_chat_interval=config.SEND_PER_CHAT_INTERVAL,
+            max_concurrency=config.SEND_MAX_CONCURRENCY,
+            max_retries=config.SEND_MAX_RETRIES
+        )
+        reminder_scheduler = ReminderScheduler(sender)
+        deduplicator = UpdateDeduplicator(
+            cache_size=config.UPDATE_DEDUP_CACHE_SIZE,
+            ttl=config.UPDATE_DEDUP_TTL,
+            cleanup_interval=config.UPDATE_DEDUP_CLEANUP_INTERVAL
+        )
+        broadcasts = BroadcastEngine(
+            sender,
+            chunk_size=config.BROADCAST_CHUNK_SIZE,
+            progress_interval=config.BROADCAST_PROGRESS_INTERVAL,
+            background=not serverless,
+            claim_timeout=config.BROADCAST_CLAIM_TIMEOUT
+        )
+        # Состояния хранятся в базе, чтобы сценарий продолжался в любом контейнере
+        storage = SQLiteStorage(
+            state_ttl=config.FSM_STATE_TTL,
+            cleanup_interval=config.FSM_CLEANUP_INTERVAL,
+            cache_size=config.FSM_CACHE_SIZE,
+            check_interval=config.FSM_CACHE_CHECK_INTERVAL
+        )
+        # Обновления одного чата - по очереди (блокировка берется до чтения состояния),
+        # разных - параллельно, администраторы - вне очереди
+        dp = Dispatcher(storage=storage, events_isolation=ChatEventIsolation())
+        dp.update.outer_middleware(UpdateSchedulerMiddleware(max_concurrency=config.UPDATE_MAX_CONCURRENCY))
+        dp["sender"] = sender  # Доступен в обработчиках как аргумент sender
+        dp["reminder_scheduler"] = reminder_scheduler
+        dp["broadcasts"] = broadcasts
         
         # Регистрация роутеров
         dp.include_router(common_router)
         dp.include_router(client_router)
         dp.include_router(admin_router)
+        
+        finished_at = time.perf_counter()
+        print(
+            f"⏱ Холодный старт: {(finished_at - started_at) * 1000:.0f} мс "
+            f"(база: {(db_ready_at - started_at) * 1000:.0f} мс, "
+            f"{'схема создана' if schema_created else 'схема актуальна'})"
+        )
     
     return bot, dp
 
 async def handler(event: dict, context):
     """Обработчик для serverless (Yandex Cloud Functions/AWS Lambda)"""
     body: str = event.get("body", "")
-    update_data = json.loads(body) if body else {}
     
     # Инициализируем бота и диспетчер
-    bot, dp = await init_bot()
+    bot, dp = await init_bot(serverless=True)
+    
+    if body:
+        # Повтор уже принятого обновления подтверждаем без обработки
+        update = Update.model_validate(json.loads(body))
+        if not await deduplicator.claim(update.update_id):
+            print(f"Повтор обновления {update.update_id} пропущен")
+            return {"statusCode": 200, "body": ""}
+        
+        # Обрабатываем обновление; при ошибке снимаем отметку, чтобы повтор вызова
+        # платформой обработал его заново
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            await deduplicator.release(update.update_id)
+            raise
+    else:
+        # Вызов по таймеру (без обновления). Фоновые планировщик напоминаний и рассылку
+        # заморозили бы вместе с функцией, поэтому наступившие напоминания и порции
+        # незавершенных рассылок отправляются здесь - и только здесь, чтобы не
+        # задерживать ответ на обновления пользователей
+        await reminder_scheduler.send_due(config.REMINDERS_PER_INVOCATION)
+        await broadcasts.run_chunks(config.BROADCAST_CHUNKS_PER_INVOCATION)
     
-    # Обрабатываем обновление
-    await dp.feed_update(bot, Update.model_validate(update_data))
+    # Ответ пользователю уже отправлен; дожидаемся фоновых уведомлений,
+    # пока функцию не заморозили
+    await drain()
     
     return {"statusCode": 200, "body": ""}
 
@@ -58,7 +139,8 @@ async def polling_main():
     bot, dp = await init_bot()
     
     # Запуск фоновых задач (только для поллинга)
-    asyncio.create_task(send_daily_reminders())
+    asyncio.create_task(reminder_scheduler.run())
+    await broadcasts.resume()
     
     print("✅ Бот запущен в режиме поллинга!")
     await dp.start_polling(bot)
@@ -67,15 +149,41 @@ async def webhook_main(webhook_url: str):
     """Основная функция для запуска бота в режиме вебхука"""
     bot, dp = await init_bot()
     
+    server = WebhookServer(
+        bot, dp, deduplicator,
+        secret_token=config.WEBHOOK_SECRET,
+        path=config.WEBHOOK_PATH,
+        queue_size=config.WEBHOOK_QUEUE_SIZE,
+        workers=config.WEBHOOK_WORKERS,
+        enqueue_timeout=config.WEBHOOK_ENQUEUE_TIMEOUT,
+        drain_timeout=config.WEBHOOK_DRAIN_TIMEOUT
+    )
+    await server.start(config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    
+    # Запуск фоновых задач
+    asyncio.create_task(reminder_scheduler.run())
+    await broadcasts.resume()
+    
     # Устанавливаем вебхук
-    await bot.set_webhook(webhook_url)
+    await bot.set_webhook(
+        webhook_url,
+        secret_token=config.WEBHOOK_SECRET,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS
+    )
     
     print(f"✅ Бот запущен в режиме вебхука! Webhook URL: {webhook_url}")
     
-    # Здесь обычно запускается веб-сервер (FastAPI, aiohttp и т.д.)
-    # Для примера оставим ожидание
-    while True:
-        await asyncio.sleep(3600)
+    # Работаем до сигнала остановки, затем дорабатываем принятые обновления
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    await stop_event.wait()
+    
+    print("⏹ Остановка вебхук-сервера...")
+    await server.stop()
+    await bot.session.close()
 
 if __name__ == "__main__":
     # Выберите режим запуска
@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+
+from database.async_database import is_admin
+
+class AdminAccessMiddleware(BaseMiddleware):
+    """Пропускает к обработчикам кнопок роутера только администраторов"""
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or not await is_admin(user.id):
+            await event.answer("Доступ запрещен", show_alert=True)
+            return None
+        
+        return await handler(event, data)
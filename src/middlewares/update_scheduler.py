@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import TelegramObject
+
+from database.async_database import is_admin, refresh_admins
+
+# Приоритеты очереди: меньше - раньше
+ADMIN_PRIORITY = 0
+CLIENT_PRIORITY = 1
+
+class PrioritySemaphore:
+    """Семафор, который при нехватке мест пропускает сначала более приоритетных.
+
+    Внутри одного приоритета соблюдается порядок ожидания.
+    """
+
+    def __init__(self, limit: int):
+        self._free = limit
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self._free > 0 and not self._waiters:
+            self._free -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Место уже было передано - возвращаем его следующему
+                self.release()
+            else:
+                self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        # Место передается ожидающему напрямую, чтобы его не перехватил новый запрос
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+class ChatEventIsolation(BaseEventIsolation):
+    """Обновления одного чата обрабатываются строго по очереди.
+
+    Передается в Dispatcher(events_isolation=...): FSMContextMiddleware берет
+    блокировку до чтения состояния, поэтому следующее обновление чата видит
+    состояние, уже измененное предыдущим. Блокировка удаляется, когда ее
+    больше никто не ждет.
+    """
+
+    def __init__(self):
+        self._locks: Dict[StorageKey, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        lock, users = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """Ограничение параллельной обработки обновлений на уровне диспетчера.
+
+    Одновременно обрабатывается не больше max_concurrency обновлений. Когда мест
+    не хватает, обновления администраторов проходят раньше клиентских, поэтому
+    наплыв записей не задерживает подтверждение. Порядок внутри чата обеспечивает
+    ChatEventIsolation. Регистрируется как outer-middleware на dp.update.
+    """
+
+    def __init__(self, max_concurrency: int = 16):
+        self._semaphore = PrioritySemaphore(max_concurrency)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        # Администраторов, добавленных другими процессами, подхватываем по версии списка
+        try:
+            await refresh_admins()
+        except Exception as e:
+            print(f"Ошибка обновления списка администраторов: {e}")
+
+        # Приоритет - по набору администраторов в памяти, без запроса к базе
+        user = data.get("event_from_user")
+        priority = ADMIN_PRIORITY if user is not None and await is_admin(user.id) else CLIENT_PRIORITY
+
+        await self._semaphore.acquire(priority)
+        try:
+            return await handler(event, data)
+        finally:
+            self._semaphore.release()
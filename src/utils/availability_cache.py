@@ -0,0 +1,103 @@
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from utils.slot_bitmap import slots_needed, time_to_minutes
+
+class AvailabilityCache:
+    """LRU-кэш свободного времени по ключу (дата, длительность услуги в слотах).
+
+    Запись живет не дольше ttl секунд и не дольше момента, когда самый ранний
+    из найденных слотов перестает быть доступным из-за буфера записи.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300, buffer_minutes: int = 30):
+        self.max_size = max_size
+        self.ttl = datetime.timedelta(seconds=ttl)
+        self.buffer = datetime.timedelta(minutes=buffer_minutes)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[datetime.datetime, List[str]]]" = OrderedDict()
+        self._by_date: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def _expires_at(self, date_str: str, times: List[str], now: datetime.datetime) -> datetime.datetime:
+        """Когда результат для даты устареет"""
+        expires_at = now + self.ttl
+        if times:
+            minute = time_to_minutes(times[0])
+            first_slot = datetime.datetime.combine(
+                datetime.date.fromisoformat(date_str), datetime.time(minute // 60, minute % 60)
+            )
+            expires_at = min(expires_at, first_slot - self.buffer)
+        return expires_at
+
+    def _remove(self, key: Tuple[str, int]):
+        self._entries.pop(key, None)
+        durations = self._by_date.get(key[0])
+        if durations is not None:
+            durations.discard(key[1])
+            if not durations:
+                del self._by_date[key[0]]
+
+    def get(self, date_str: str, service_duration: int,
+            now: Optional[datetime.datetime] = None) -> Optional[List[str]]:
+        """Получить свободное время из кэша или None, если записи нет или она устарела"""
+        now = now or datetime.datetime.now()
+        key = (date_str, slots_needed(service_duration))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now > entry[0]:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, date_str: str, service_duration: int, times: List[str],
+            now: Optional[datetime.datetime] = None):
+        """Сохранить свободное время для даты"""
+        now = now or datetime.datetime.now()
+        key = (date_str, slots_needed(service_duration))
+        entry = (self._expires_at(date_str, times, now), list(times))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._by_date.setdefault(date_str, set()).add(key[1])
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def invalidate_date(self, date_str: str):
+        """Сбросить все записи на дату (после изменения записей или расписания)"""
+        with self._lock:
+            for slots in self._by_date.pop(date_str, set()):
+                self._entries.pop((date_str, slots), None)
+
+    def clear(self):
+        """Полностью очистить кэш"""
+        with self._lock:
+            self._entries.clear()
+            self._by_date.clear()
+
+    def stats(self) -> dict:
+        """Статистика использования кэша для подбора его размера"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+availability_cache = AvailabilityCache(
+    max_size=config.AVAILABILITY_CACHE_SIZE,
+    ttl=config.AVAILABILITY_CACHE_TTL,
+    buffer_minutes=config.BOOKING_BUFFER_MINUTES
+)
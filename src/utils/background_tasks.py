@@ -0,0 +1,22 @@
+import asyncio
+from typing import Coroutine, Optional, Set
+
+# Ссылки на запущенные задачи, чтобы их не удалил сборщик мусора до завершения
+_tasks: Set[asyncio.Task] = set()
+
+def _on_done(task: asyncio.Task):
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Ошибка фоновой задачи: {task.exception()}")
+
+def spawn(coro: Coroutine) -> asyncio.Task:
+    """Запустить корутину в фоне, не дожидаясь ее завершения"""
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+async def drain(timeout: Optional[float] = None):
+    """Дождаться завершения фоновых задач (в serverless - до возврата ответа)"""
+    if _tasks:
+        await asyncio.wait(set(_tasks), timeout=timeout)
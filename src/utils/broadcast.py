@@ -0,0 +1,134 @@
+import asyncio
+from typing import Dict, Optional
+
+from database.async_database import (
+    get_broadcast_job, get_running_broadcast_jobs, claim_broadcast_chunk,
+    record_broadcast_results, abandon_claimed_deliveries, finish_broadcast_job
+)
+from utils.message_sender import MessageSender
+
+AUDIENCE_NAMES = {
+    'all': 'всем клиентам',
+    'today': 'клиентам на сегодня',
+    'tomorrow': 'клиентам на завтра',
+}
+
+def format_broadcast_progress(job) -> str:
+    """Текст сообщения с ходом рассылки"""
+    done = job['sent_count'] + job['failed_count']
+    title = "✅ Рассылка завершена" if job['status'] == 'done' else "📢 Идет рассылка"
+
+    return (
+        f"{title} #{job['job_id']} ({AUDIENCE_NAMES.get(job['audience'], job['audience'])})\n\n"
+        f"📨 Обработано: {done} из {job['total_count']}\n"
+        f"✅ Доставлено: {job['sent_count']}\n"
+        f"❌ Ошибок: {job['failed_count']}"
+    )
+
+class BroadcastEngine:
+    """Рассылки клиентам по заданиям из таблицы broadcast_jobs.
+
+    Получатели читаются из базы порциями и отправляются через MessageSender.
+    Каждый получатель отмечается в журнале до отправки, поэтому после
+    перезапуска рассылка продолжается с места остановки без повторов.
+    Ход рассылки показывается администратору в одном редактируемом сообщении.
+
+    В поллинге и вебхуке рассылка идет фоновой задачей (background=True).
+    В serverless фоновую задачу заморозят вместе с функцией, поэтому вызов
+    функции по таймеру сам отправляет не больше нескольких порций через run_chunks.
+    """
+
+    def __init__(self, sender: MessageSender, chunk_size: int = 100, progress_interval: float = 3,
+                 background: bool = True, claim_timeout: float = 600):
+        self.sender = sender
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self.background = background
+        self.claim_timeout = claim_timeout
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def start(self, job_id: int) -> Optional[asyncio.Task]:
+        """Запустить рассылку в фоне (повторный запуск того же задания игнорируется).
+
+        Без фоновых задач задание остается в очереди и отправляется через run_chunks.
+        """
+        if not self.background:
+            return None
+
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return task
+
+    async def resume(self):
+        """Продолжить рассылки, прерванные перезапуском бота"""
+        for job_id in await get_running_broadcast_jobs():
+            await abandon_claimed_deliveries(job_id)
+            self.start(job_id)
+
+    async def run_chunks(self, max_chunks: int) -> int:
+        """Отправить не больше max_chunks порций незавершенных рассылок и вернуть их число.
+
+        Захваты, которые висят дольше claim_timeout, считаются прерванными:
+        более свежие может прямо сейчас отправлять параллельный вызов.
+        """
+        chunks = 0
+        for job_id in await get_running_broadcast_jobs():
+            if chunks >= max_chunks:
+                break
+            await abandon_claimed_deliveries(job_id, self.claim_timeout)
+            chunks += await self._run(job_id, max_chunks - chunks)
+        return chunks
+
+    async def _report(self, job_id: int):
+        """Обновить сообщение с ходом рассылки"""
+        job = await get_broadcast_job(job_id)
+        if job is None or not job['progress_message_id']:
+            return
+
+        try:
+            await self.sender.bot.edit_message_text(
+                chat_id=job['admin_chat_id'],
+                message_id=job['progress_message_id'],
+                text=format_broadcast_progress(job)
+            )
+        except Exception as e:
+            print(f"Ошибка обновления хода рассылки #{job_id}: {e}")
+
+    async def _run(self, job_id: int, max_chunks: Optional[int] = None) -> int:
+        """Отправить рассылку порциями до конца списка получателей (или max_chunks порций).
+
+        Возвращает количество отправленных порций.
+        """
+        chunks = 0
+        try:
+            job = await get_broadcast_job(job_id)
+            if job is None:
+                return chunks
+
+            loop = asyncio.get_running_loop()
+            reported_at = loop.time()
+
+            while max_chunks is None or chunks < max_chunks:
+                user_ids = await claim_broadcast_chunk(job_id, self.chunk_size)
+                if not user_ids:
+                    await finish_broadcast_job(job_id)
+                    break
+
+                results = await self.sender.send_each(
+                    [(user_id, job['text']) for user_id in user_ids], parse_mode="HTML"
+                )
+                await record_broadcast_results(job_id, list(zip(user_ids, results)))
+                chunks += 1
+
+                if loop.time() - reported_at >= self.progress_interval:
+                    await self._report(job_id)
+                    reported_at = loop.time()
+
+            await self._report(job_id)
+        except Exception as e:
+            # Задание остается незавершенным и продолжится при следующем запуске
+            print(f"Ошибка рассылки #{job_id}: {e}")
+        return chunks
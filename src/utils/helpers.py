@@ -11,6 +11,19 @@ def calculate_end_time(start_datetime: str, duration_minutes: int) -> str:
     end_dt = dt + datetime.timedelta(minutes=duration_minutes)
     return end_dt.strftime('%H:%M')
 
+def format_duration(minutes: int) -> str:
+    """Форматировать длительность услуги: '45 мин', '1 час', '2 часа', '1 ч 30 мин'"""
+    hours, rest = divmod(minutes, 60)
+    if not hours:
+        return f"{rest} мин"
+    if rest:
+        return f"{hours} ч {rest} мин"
+    if hours % 10 == 1 and hours % 100 != 11:
+        return f"{hours} час"
+    if hours % 10 in (2, 3, 4) and hours % 100 not in (12, 13, 14):
+        return f"{hours} часа"
+    return f"{hours} часов"
+
 def validate_date(date_str: str) -> bool:
     """Проверить корректность даты"""
     try:
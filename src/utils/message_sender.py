@@ -0,0 +1,115 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+class TokenBucket:
+    """Ведро токенов: в среднем не больше rate операций в секунду, всплеск до burst"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at: Optional[float] = None
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов (например, после RetryAfter от Telegram)"""
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def acquire(self):
+        """Дождаться и забрать один токен"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            if self._updated_at is not None:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class MessageSender:
+    """Отправка исходящих сообщений с учетом лимитов Telegram.
+
+    Общий лимит - ведро токенов, на каждый чат - не чаще раза в per_chat_interval
+    секунд, одновременно - не больше max_concurrency запросов. На RetryAfter
+    отправка приостанавливается на указанное Telegram время и повторяется.
+    Использует сессию переданного бота, сессия между отправками не закрывается.
+    """
+
+    def __init__(self, bot: Bot, rate: float = 25, burst: int = 5,
+                 per_chat_interval: float = 1.0, max_concurrency: int = 10, max_retries: int = 3):
+        self.bot = bot
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._chat_next_at: Dict[int, float] = {}
+
+    async def _wait_for_chat(self, chat_id: int):
+        """Соблюсти интервал между сообщениями в один чат"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        send_at = max(now, self._chat_next_at.get(chat_id, 0.0))
+        self._chat_next_at[chat_id] = send_at + self.per_chat_interval
+
+        if len(self._chat_next_at) > 10000:
+            # Забываем чаты, для которых интервал уже прошел
+            self._chat_next_at = {
+                chat: next_at for chat, next_at in self._chat_next_at.items() if next_at > now
+            }
+
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Message:
+        """Отправить сообщение с учетом лимитов и повтором после RetryAfter"""
+        attempt = 0
+        while True:
+            await self._wait_for_chat(chat_id)
+            async with self._semaphore:
+                await self._bucket.acquire()
+                try:
+                    return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                except TelegramRetryAfter as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self._bucket.pause(e.retry_after)
+
+    async def _send_safe(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Отправить сообщение, не прерывая рассылку из-за ошибки одного получателя"""
+        try:
+            await self.send_message(chat_id, text, **kwargs)
+            return True
+        except Exception as e:
+            print(f"Ошибка отправки сообщения {chat_id}: {e}")
+            return False
+
+    async def send_each(self, messages: Iterable[Tuple[int, str]], **kwargs) -> List[bool]:
+        """Отправить пачку сообщений (chat_id, text) параллельно.
+
+        Возвращает признак успешной отправки для каждого сообщения по порядку.
+        """
+        return list(await asyncio.gather(*(
+            self._send_safe(chat_id, text, **kwargs) for chat_id, text in messages
+        )))
+
+    async def send_many(self, messages: Iterable[Tuple[int, str]], **kwargs) -> Tuple[int, int]:
+        """Отправить пачку сообщений (chat_id, text) параллельно.
+
+        Возвращает количество успешно отправленных и неудачных сообщений.
+        """
+        results = await self.send_each(messages, **kwargs)
+        sent = sum(results)
+        return sent, len(results) - sent
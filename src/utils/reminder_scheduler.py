@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database.async_database import claim_due_reminders, get_next_reminder_time
+from utils.message_sender import MessageSender
+
+class ReminderScheduler:
+    """Отправка напоминаний о записях точно ко времени из таблицы reminders.
+
+    Между срабатываниями планировщик спит до ближайшего remind_at и ничего не делает.
+    После подтверждения или отмены записи его нужно разбудить через wake(),
+    чтобы он пересчитал время следующего напоминания.
+
+    В serverless цикл не запускается: вызов функции по таймеру отправляет
+    наступившие напоминания через send_due с ограничением на количество.
+    """
+
+    def __init__(self, sender: MessageSender):
+        self.sender = sender
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self):
+        """Пересчитать время ближайшего напоминания"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def send_due(self, limit: Optional[int] = None) -> int:
+        """Отправить наступившие напоминания (не больше limit) и вернуть их количество"""
+        reminders = await claim_due_reminders(datetime.now(), limit)
+
+        messages = []
+        for reminder in reminders:
+            dt = datetime.strptime(reminder['booking_datetime'], '%Y-%m-%d %H:%M:%S')
+            end_time = dt + timedelta(minutes=reminder['duration_minutes'])
+
+            messages.append((
+                reminder['user_id'],
+                f"🔔 *Напоминание о записи!*\n\n"
+                f"{dt.strftime('%d.%m.%Y')} у вас запись:\n"
+                f"💅 *{reminder['service_name']}*\n"
+                f"⏰ *Время:* {dt.strftime('%H:%M')} - {end_time.strftime('%H:%M')}\n\n"
+                f"📍 *Адрес:* г. Москва, ул. Садовая Триумфальная, д. 4/10\n\n"
+                "💖 *Ждем вас!*"
+            ))
+
+        if messages:
+            await self.sender.send_many(messages, parse_mode="HTML")
+        return len(messages)
+
+    async def run(self):
+        """Основной цикл планировщика"""
+        self._wakeup = asyncio.Event()
+
+        while True:
+            # Сбрасываем флаг до чтения базы, чтобы не пропустить изменения во время запроса
+            self._wakeup.clear()
+            try:
+                await self.send_due()
+                next_at = await get_next_reminder_time()
+                timeout = None if next_at is None else max(0.0, (next_at - datetime.now()).total_seconds())
+            except Exception as e:
+                print(f"Ошибка планировщика напоминаний: {e}")
+                timeout = 60
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -1,139 +1,155 @@
 import datetime
-from typing import List
-from database.database import get_db_connection
+from typing import Dict, Iterable, List, Tuple
+from database.database import ACTIVE_BOOKINGS_SQL, db_connection, day_range, pool
+from utils.slot_bitmap import DayBitmap, min_start_minute
+from utils.availability_cache import availability_cache
 import config
 
-def init_schedule(days_ahead: int = 60):
-    """Инициализировать расписание на N дней вперед"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    today = datetime.date.today()
-    
-    for day in range(days_ahead):
-        current_date = today + datetime.timedelta(days=day)
-        
-        # Определяем рабочие часы
-        if current_date.weekday() == 4 or current_date.weekday() == 5 or current_date.weekday() == 3:  # Выходные
-            continue
-        elif current_date.weekday() == 6:  # Воскресенье
-            work_hours = config.WORKING_HOURS_WEEKEND
-        else:  # Будни
-            work_hours = config.WORKING_HOURS_WEEKDAY
-        
-        for time in work_hours:
+# Расписание не хранится по слотам: рабочие слоты дня берутся из недельного шаблона
+# config.WEEKLY_SCHEDULE, а в таблице schedule_exceptions лежат только отклонения от него
+
+def template_slots(day: datetime.date) -> List[str]:
+    """Рабочие слоты дня по недельному шаблону"""
+    return config.WEEKLY_SCHEDULE.get(day.weekday(), [])
+
+def build_day_slots(day: datetime.date, exceptions: Iterable[Tuple[str, int]] = ()) -> List[Tuple[str, int]]:
+    """Слоты дня (время, доступен) с учетом исключений из расписания"""
+    slots = {slot_time: 1 for slot_time in template_slots(day)}
+    for slot_time, is_available in exceptions:
+        slots[slot_time] = is_available
+    return sorted(slots.items())
+
+@pool.retry_on_busy
+def set_slot_availability(date_str: str, time_str: str, is_available: bool):
+    """Закрыть или открыть слот на дату.
+
+    Хранится только отклонение от шаблона: если слот возвращается к шаблонному
+    состоянию, исключение удаляется.
+    """
+    day = datetime.date.fromisoformat(date_str)
+    in_template = time_str in template_slots(day)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if is_available == in_template:
+            cursor.execute(
+                'DELETE FROM schedule_exceptions WHERE exception_date = ? AND slot_time = ?',
+                (date_str, time_str)
+            )
+        else:
             cursor.execute('''
-                INSERT OR IGNORE INTO schedule_slots (slot_date, slot_time) 
-                VALUES (?, ?)
-            ''', (current_date, time))
-    
-    conn.commit()
-    conn.close()
+                INSERT INTO schedule_exceptions (exception_date, slot_time, is_available)
+                VALUES (?, ?, ?)
+                ON CONFLICT (exception_date, slot_time) DO UPDATE SET is_available = excluded.is_available
+            ''', (date_str, time_str, int(is_available)))
+
+    # Расписание дня изменилось - сбрасываем кэш свободного времени
+    availability_cache.invalidate_date(date_str)
 
 def get_available_time_slots(date_str: str, service_duration: int) -> List[str]:
     """Получить доступные временные слоты"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Получаем все слоты на дату
-    cursor.execute('''
-        SELECT slot_time, is_available 
-        FROM schedule_slots 
-        WHERE slot_date = ? 
-        ORDER BY slot_time
-    ''', (date_str,))
-    
-    slots = cursor.fetchall()
-    
-    # Получаем занятые записи
-    cursor.execute('''
-        SELECT b.booking_datetime, s.duration_minutes
-        FROM bookings b
-        JOIN services s ON b.service_id = s.service_id
-        WHERE DATE(b.booking_datetime) = ? 
-        AND b.status IN ('confirmed', 'pending')
-    ''', (date_str,))
-    
-    bookings = cursor.fetchall()
-    conn.close()
-    
-    # Создаем множество занятых слотов
-    busy_slots = set()
+    cached = availability_cache.get(date_str, service_duration)
+    if cached is not None:
+        return cached
     
-    for booking_datetime, duration in bookings:
-        start_time = datetime.datetime.strptime(booking_datetime, '%Y-%m-%d %H:%M:%S').time()
+    with db_connection() as conn:
+        cursor = conn.cursor()
         
-        # Вычисляем занятые слоты
-        slots_needed = duration // 30
-        if duration % 30 > 0:
-            slots_needed += 1
+        # Отклонения от шаблона на дату
+        cursor.execute('''
+            SELECT slot_time, is_available 
+            FROM schedule_exceptions 
+            WHERE exception_date = ?
+        ''', (date_str,))
         
-        current_time = start_time
-        for _ in range(slots_needed):
-            busy_slots.add(current_time.strftime('%H:%M'))
-            current_time = (datetime.datetime.combine(datetime.date.today(), current_time) + 
-                          datetime.timedelta(minutes=30)).time()
+        exceptions = cursor.fetchall()
+        
+        # Получаем занятые записи
+        cursor.execute(ACTIVE_BOOKINGS_SQL, day_range(date_str))
+        
+        bookings = cursor.fetchall()
     
-    # Определяем доступные слоты для услуги
-    available_slots = []
-    slots_needed_for_service = service_duration // 30
-    if service_duration % 30 > 0:
-        slots_needed_for_service += 1
-
+    slot_date = datetime.date.fromisoformat(date_str)
+    day = DayBitmap(build_day_slots(slot_date, exceptions))
     now = datetime.datetime.now()
-    current_date = now.date()
-    slot_date = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+    start_minute = min_start_minute(slot_date, now, config.BOOKING_BUFFER_MINUTES)
     
-    for i in range(len(slots) - slots_needed_for_service + 1):
-        slot_time_str, is_available = slots[i]
+    available = day.free_starts(day.busy_mask(bookings), service_duration, start_minute)
+    availability_cache.put(date_str, service_duration, available, now)
+    return available
+
+def _compute_availability(first_date: datetime.date, last_date: datetime.date,
+                          service_duration: int, now: datetime.datetime) -> Dict[str, List[str]]:
+    """Рассчитать свободное время на все даты диапазона двумя запросами"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
         
-        # Проверяем, свободен ли начальный слот
-        if is_available and slot_time_str not in busy_slots:
-            # Проверяем, свободны ли все последующие слоты
-            all_free = True
-            for j in range(slots_needed_for_service):
-                next_slot_time, next_available = slots[i + j]
-                if not next_available or next_slot_time in busy_slots:
-                    all_free = False
-                    break
-            
-            if all_free:
-                # Проверяем, не прошло ли уже время слота
-                slot_time = datetime.datetime.strptime(slot_time_str, "%H:%M").time()
-                slot_datetime = datetime.datetime.combine(slot_date, slot_time)
-                
-                # Добавляем буфер (30 минут) для возможности записи
-                buffer_time = datetime.timedelta(minutes=30)
-                
-                # Если дата в будущем или сегодня, но время еще не наступило (с учетом буфера)
-                if slot_date > current_date or (slot_date == current_date and slot_datetime >= (now + buffer_time)):
-                    available_slots.append(slot_time_str)
-    
-    return available_slots
+        # Все отклонения от шаблона в диапазоне одним запросом
+        cursor.execute('''
+            SELECT exception_date, slot_time, is_available 
+            FROM schedule_exceptions 
+            WHERE exception_date BETWEEN ? AND ?
+        ''', (first_date.isoformat(), last_date.isoformat()))
+        
+        exceptions_by_date = {}
+        for exception_date, slot_time, is_available in cursor.fetchall():
+            exceptions_by_date.setdefault(exception_date, []).append((slot_time, is_available))
+        
+        # Все активные записи диапазона одним запросом
+        cursor.execute(ACTIVE_BOOKINGS_SQL, day_range(first_date, days=(last_date - first_date).days + 1))
+        
+        bookings_by_date = {}
+        for booking_datetime, duration in cursor.fetchall():
+            bookings_by_date.setdefault(booking_datetime[:10], []).append((booking_datetime, duration))
+    
+    available = {}
+    current_date = first_date
+    while current_date <= last_date:
+        date_str = current_date.isoformat()
+        slots = build_day_slots(current_date, exceptions_by_date.get(date_str, ()))
+        if slots:
+            day = DayBitmap(slots)
+            start_minute = min_start_minute(current_date, now, config.BOOKING_BUFFER_MINUTES)
+            busy = day.busy_mask(bookings_by_date.get(date_str, ()))
+            available[date_str] = day.free_starts(busy, service_duration, start_minute)
+        current_date += datetime.timedelta(days=1)
+    
+    return available
+
+def get_available_slots_by_date(service_duration: int, days_ahead: int = 14) -> Dict[str, List[str]]:
+    """Получить свободное время для услуги на все даты горизонта за один проход"""
+    now = datetime.datetime.now()
+    today = now.date()
+    dates = [(today + datetime.timedelta(days=day)).isoformat() for day in range(days_ahead + 1)]
+    
+    # Берем из кэша все, что есть, остальное считаем одним диапазоном
+    times_by_date = {}
+    missing = []
+    for date_str in dates:
+        cached = availability_cache.get(date_str, service_duration, now)
+        if cached is None:
+            missing.append(date_str)
+        else:
+            times_by_date[date_str] = cached
+    
+    if missing:
+        computed = _compute_availability(
+            datetime.date.fromisoformat(missing[0]), datetime.date.fromisoformat(missing[-1]),
+            service_duration, now
+        )
+        for date_str in missing:
+            times = computed.get(date_str, [])
+            availability_cache.put(date_str, service_duration, times, now)
+            times_by_date[date_str] = times
+    
+    return {date_str: times_by_date[date_str] for date_str in dates if times_by_date[date_str]}
+
+def is_slot_available(date_str: str, time_str: str, service_duration: int) -> bool:
+    """Проверить по базе (без кэша), что время еще свободно для услуги"""
+    day = datetime.date.fromisoformat(date_str)
+    available = _compute_availability(day, day, service_duration, datetime.datetime.now())
+    return time_str in available.get(date_str, [])
 
 def get_available_dates_with_slots(service_duration: int, days_ahead: int = 14) -> List[str]:
     """Получить даты с доступными слотами"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    today = datetime.date.today()
-    end_date = today + datetime.timedelta(days=days_ahead)
-    
-    cursor.execute('''
-        SELECT DISTINCT slot_date 
-        FROM schedule_slots 
-        WHERE slot_date BETWEEN ? AND ?
-        AND (CAST(strftime('%w', slot_date) AS INTEGER) NOT IN (4, 5, 6))
-        ORDER BY slot_date
-    ''', (today, end_date))
-    
-    all_dates = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    
-    # Фильтруем даты
-    available_dates = []
-    for date_str in all_dates:
-        if get_available_time_slots(date_str, service_duration):
-            available_dates.append(date_str)
-    
-    return available_dates
\ No newline at end of file
+    return list(get_available_slots_by_date(service_duration, days_ahead))
@@ -0,0 +1,92 @@
+import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+SLOT_MINUTES = 30
+DAY_MINUTES = 24 * 60
+
+def slots_needed(duration_minutes: int) -> int:
+    """Сколько слотов по 30 минут занимает услуга (минимум один)"""
+    return max(1, -(-duration_minutes // SLOT_MINUTES))
+
+def time_to_minutes(time_str: str) -> int:
+    """Перевести 'ЧЧ:ММ' в минуты от начала суток"""
+    return int(time_str[:2]) * 60 + int(time_str[3:5])
+
+def min_start_minute(slot_date: datetime.date, now: datetime.datetime, buffer_minutes: int) -> int:
+    """С какой минуты суток на дату еще можно записаться с учетом буфера.
+
+    Для прошедших дат возвращает DAY_MINUTES, то есть ни один слот не подходит.
+    """
+    if slot_date > now.date():
+        return 0
+    threshold = now + datetime.timedelta(minutes=buffer_minutes)
+    if slot_date < now.date() or threshold.date() > slot_date:
+        return DAY_MINUTES
+    minute = threshold.hour * 60 + threshold.minute
+    # Слот в ЧЧ:ММ:00 раньше порога, если у порога есть секунды
+    if threshold.second or threshold.microsecond:
+        minute += 1
+    return minute
+
+class DayBitmap:
+    """Слоты одного дня в виде битовой маски: бит i - i-й слот расписания"""
+
+    __slots__ = ('times', 'minutes', 'index', 'available')
+
+    def __init__(self, slots: Iterable[Tuple[str, int]]):
+        self.times: List[str] = []
+        self.minutes: List[int] = []
+        self.index: Dict[int, int] = {}
+        self.available = 0
+
+        for bit, (slot_time, is_available) in enumerate(slots):
+            minute = time_to_minutes(slot_time)
+            self.times.append(slot_time)
+            self.minutes.append(minute)
+            self.index.setdefault(minute, bit)
+            if is_available:
+                self.available |= 1 << bit
+
+    def busy_mask(self, bookings: Iterable[Tuple[str, int]]) -> int:
+        """Маска слотов, занятых записями (booking_datetime, duration_minutes)"""
+        busy = 0
+        index = self.index
+        for booking_datetime, duration in bookings:
+            start = time_to_minutes(booking_datetime[11:16])
+            for step in range(slots_needed(duration)):
+                bit = index.get((start + step * SLOT_MINUTES) % DAY_MINUTES)
+                if bit is not None:
+                    busy |= 1 << bit
+        return busy
+
+    def not_before_mask(self, minute: int) -> int:
+        """Маска слотов, начинающихся не раньше указанной минуты суток"""
+        mask = 0
+        for bit, slot_minute in enumerate(self.minutes):
+            if slot_minute >= minute:
+                mask |= 1 << bit
+        return mask
+
+    def free_starts(self, busy: int, service_duration: int, start_minute: int = 0) -> List[str]:
+        """Время начала, с которого подряд свободно столько слотов, сколько нужно услуге"""
+        if start_minute >= DAY_MINUTES:
+            return []
+
+        free = self.available & ~busy
+        # Бит i остается, только если свободны слоты i..i+n-1
+        window = free
+        for shift in range(1, slots_needed(service_duration)):
+            window &= free >> shift
+        if start_minute:
+            window &= self.not_before_mask(start_minute)
+
+        return mask_to_times(window, self.times)
+
+def mask_to_times(mask: int, times: Sequence[str]) -> List[str]:
+    """Список времен слотов, соответствующих установленным битам"""
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(times[low.bit_length() - 1])
+        mask ^= low
+    return result
@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+
+from database.async_database import claim_update, release_update, delete_expired_updates
+
+class UpdateDeduplicator:
+    """Журнал обработанных обновлений для защиты от повторной доставки.
+
+    Последние update_id хранятся в памяти (ограниченный набор), остальные
+    проверяются по таблице processed_updates. Обновление отмечается до обработки,
+    поэтому повтор, пришедший во время медленной обработки, тоже отбрасывается.
+    Если обработка не удалась, отметка снимается через release, чтобы повтор
+    доставки обработал обновление заново.
+    """
+
+    def __init__(self, cache_size: int = 10000, ttl: float = 24 * 3600, cleanup_interval: float = 3600):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._cleaned_at = 0.0
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        while len(self._seen) > self.cache_size:
+            self._seen.popitem(last=False)
+
+    async def claim(self, update_id: int) -> bool:
+        """Отметить обновление; False, если оно уже обрабатывалось"""
+        if update_id in self._seen:
+            return False
+
+        is_new = await claim_update(update_id)
+        self._remember(update_id)
+        await self._cleanup()
+        return is_new
+
+    async def release(self, update_id: int):
+        """Снять отметку с обновления, обработка которого завершилась ошибкой"""
+        self._seen.pop(update_id, None)
+        await release_update(update_id)
+
+    async def _cleanup(self):
+        """Удалить старые записи журнала не чаще раза в cleanup_interval"""
+        now = time.monotonic()
+        if now - self._cleaned_at < self.cleanup_interval:
+            return
+        self._cleaned_at = now
+
+        try:
+            await delete_expired_updates(self.ttl)
+        except Exception as e:
+            print(f"Ошибка очистки журнала обновлений: {e}")
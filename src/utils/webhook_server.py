@@ -0,0 +1,126 @@
+import asyncio
+import hmac
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from aiohttp import web
+
+from utils.background_tasks import drain
+from utils.update_dedup import UpdateDeduplicator
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """Веб-сервер для приема обновлений от Telegram.
+
+    Запрос проверяется по секретному токену, обновление кладется в ограниченную
+    очередь и Telegram сразу получает ответ. Обработку выполняют workers
+    фоновых задач, у каждой своя очередь: обновления одного чата всегда попадают
+    к одной задаче и отмечаются в журнале и обрабатываются в порядке поступления.
+    Если очередь заполнена дольше enqueue_timeout, сервер отвечает
+    503 и Telegram повторит доставку позже. При остановке новые запросы не
+    принимаются, а уже принятые обновления дорабатываются не дольше drain_timeout.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, deduplicator: UpdateDeduplicator,
+                 secret_token: str, path: str = '/webhook', queue_size: int = 1000,
+                 workers: int = 8, enqueue_timeout: float = 1.0, drain_timeout: float = 30):
+        self.bot = bot
+        self.dp = dp
+        self.deduplicator = deduplicator
+        self.secret_token = secret_token
+        self.path = path
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+        self.drain_timeout = drain_timeout
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)
+        ]
+        self._workers: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        """Приложение aiohttp с обработчиком вебхука"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принять обновление и сразу ответить Telegram"""
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token, self.secret_token):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            print(f"Некорректное обновление: {e}")
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self._queue_for(update).put(update), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            # Очередь переполнена - Telegram повторит доставку позже
+            return web.Response(status=503, headers={'Retry-After': '1'})
+
+        return web.Response()
+
+    def _queue_for(self, update: Update) -> asyncio.Queue:
+        """Очередь обработчика, которому принадлежит чат обновления"""
+        context = UserContextMiddleware.resolve_event_context(update)
+        if context.chat is not None:
+            key = context.chat.id
+        elif context.user is not None:
+            key = context.user.id
+        else:
+            key = update.update_id
+        return self._queues[key % len(self._queues)]
+
+    async def _worker(self, queue: asyncio.Queue):
+        """Обрабатывать обновления из своей очереди по одному"""
+        while True:
+            update = await queue.get()
+            try:
+                if await self.deduplicator.claim(update.update_id):
+                    await self.dp.feed_update(self.bot, update)
+                else:
+                    print(f"Повтор обновления {update.update_id} пропущен")
+            except Exception as e:
+                print(f"Ошибка обработки обновления {update.update_id}: {e}")
+                try:
+                    await self.deduplicator.release(update.update_id)
+                except Exception as release_error:
+                    print(f"Ошибка снятия отметки обновления {update.update_id}: {release_error}")
+            finally:
+                queue.task_done()
+
+    async def start(self, host: str, port: int):
+        """Запустить обработчики очереди и веб-сервер"""
+        self._workers = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        """Перестать принимать обновления и доработать уже принятые"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), timeout=self.drain_timeout
+            )
+        except asyncio.TimeoutError:
+            left = sum(queue.qsize() for queue in self._queues)
+            print(f"Не обработано обновлений при остановке: {left}")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        await drain(timeout=self.drain_timeout)
@@ -0,0 +1,42 @@
+import datetime
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+import config
+
+# Пул соединений создается при импорте модуля базы - до импорта уводим его
+# от рабочей базы бота во временный каталог
+config.DB_NAME = os.path.join(tempfile.mkdtemp(prefix='bot-tests-'), 'bot.db')
+
+from database import database
+from utils.availability_cache import availability_cache
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Модуль базы над новой пустой базой с примененными миграциями"""
+    database.pool.close()
+    database.pool.db_name = str(tmp_path / 'bot.db')
+    database.service_catalog.invalidate()
+    database._admin_ids = None
+    availability_cache.clear()
+
+    database.init_db()
+    yield database
+
+    database.pool.close()
+
+
+@pytest.fixture
+def future_day():
+    """Рабочий день (по недельному шаблону) через месяц, ISO-строкой"""
+    day = datetime.date.today() + datetime.timedelta(days=30)
+    while not config.WEEKLY_SCHEDULE.get(day.weekday()):
+        day += datetime.timedelta(days=1)
+    return day.isoformat()
@@ -0,0 +1,25 @@
+import sqlite3
+
+
+def test_is_admin_does_not_query_database(db, monkeypatch):
+    db.add_admin(42)
+
+    def no_database():
+        raise AssertionError("is_admin обратился к базе")
+
+    monkeypatch.setattr(db, 'db_connection', no_database)
+    assert db.is_admin(42)
+    assert not db.is_admin(7)
+
+
+def test_refresh_picks_up_admin_added_by_other_process(db):
+    db.load_admins()
+    other = sqlite3.connect(db.pool.db_name)
+    with other:
+        other.execute('INSERT INTO admins (user_id) VALUES (7)')
+    other.close()
+
+    assert not db.is_admin(7)
+    db.refresh_admins()
+    assert db.is_admin(7)
+    assert db.get_all_admins() == [7]
@@ -0,0 +1,77 @@
+import pytest
+
+PAGE_SIZE = 3
+
+
+@pytest.fixture
+def pending_ids(db):
+    """Ожидающие записи, часть - на одно и то же время (порядок решает booking_id)"""
+    db.save_user(1, 'client', 'Клиент')
+    times = [
+        '2030-01-05 10:00:00', '2030-01-03 12:00:00', '2030-01-05 10:00:00',
+        '2030-01-04 11:00:00', '2030-01-05 10:00:00', '2030-01-03 12:00:00',
+        '2030-01-06 09:30:00', '2030-01-02 15:00:00',
+    ]
+    with db.db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO bookings (user_id, service_id, booking_datetime, status) VALUES (1, 2, ?, 'pending')",
+            [(booking_datetime,) for booking_datetime in times]
+        )
+        # Подтвержденная запись в список ожидающих не попадает
+        conn.execute(
+            "INSERT INTO bookings (user_id, service_id, booking_datetime, status) "
+            "VALUES (1, 2, '2030-01-04 11:00:00', 'confirmed')"
+        )
+        rows = conn.execute(
+            "SELECT booking_id FROM bookings WHERE status = 'pending' ORDER BY booking_datetime, booking_id"
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def cursor_of(booking):
+    return booking['booking_datetime'], booking['booking_id']
+
+
+def test_forward_pages_cover_list_once_in_order(db, pending_ids):
+    seen = []
+    bookings, has_prev, has_next = db.get_bookings_page('pending', PAGE_SIZE)
+    assert not has_prev
+
+    while True:
+        seen.extend(booking['booking_id'] for booking in bookings)
+        if not has_next:
+            break
+        bookings, has_prev, has_next = db.get_bookings_page('pending', PAGE_SIZE, after=cursor_of(bookings[-1]))
+        assert has_prev
+
+    assert seen == pending_ids
+
+
+def test_backward_pages_return_previous_page(db, pending_ids):
+    pages = [db.get_bookings_page('pending', PAGE_SIZE)]
+    while pages[-1][2]:
+        pages.append(db.get_bookings_page('pending', PAGE_SIZE, after=cursor_of(pages[-1][0][-1])))
+
+    # Назад от каждой страницы (кроме первой) - ровно предыдущая страница
+    for previous, current in zip(pages, pages[1:]):
+        bookings, has_prev, has_next = db.get_bookings_page('pending', PAGE_SIZE, before=cursor_of(current[0][0]))
+        assert [b['booking_id'] for b in bookings] == [b['booking_id'] for b in previous[0]]
+        assert has_next
+        assert has_prev == (previous is not pages[0])
+
+
+def test_all_bookings_cursor_walks_newest_first(db, pending_ids):
+    seen = []
+    before = None
+    while True:
+        page = db.get_all_bookings(limit=PAGE_SIZE, before=before)
+        if not page:
+            break
+        seen.extend(booking['booking_id'] for booking in page)
+        before = cursor_of(page[-1])
+
+    with db.db_connection() as conn:
+        expected = [row[0] for row in conn.execute(
+            'SELECT booking_id FROM bookings ORDER BY booking_datetime DESC, booking_id DESC'
+        )]
+    assert seen == expected
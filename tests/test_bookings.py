@@ -0,0 +1,56 @@
+import threading
+
+
+def count_bookings(db):
+    with db.db_connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0]
+
+
+def test_create_booking_with_same_key_returns_existing_booking(db, future_day):
+    created, _, booking_id = db.create_booking(1, 2, f'{future_day} 10:00:00', 'key-1')
+    repeated, message, repeated_id = db.create_booking(1, 2, f'{future_day} 10:00:00', 'key-1')
+
+    assert created
+    assert not repeated
+    assert repeated_id == booking_id
+    assert message == "Эта запись уже оформлена"
+    assert count_bookings(db) == 1
+
+
+
+def test_concurrent_confirmations_of_one_slot_create_one_booking(db, future_day):
+    workers = 8
+    barrier = threading.Barrier(workers)
+    results = []
+
+    def confirm(user_id):
+        barrier.wait()
+        results.append(db.create_booking(user_id, 3, f'{future_day} 10:00:00', f'key-{user_id}'))
+
+    threads = [threading.Thread(target=confirm, args=(user_id,)) for user_id in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(created for created, _, _ in results) == 1
+    assert count_bookings(db) == 1
+
+
+def test_overlapping_booking_is_rejected(db, future_day):
+    # 60 минут с 10:00 занимают слоты 10:00 и 10:30
+    assert db.create_booking(1, 3, f'{future_day} 10:00:00')[0]
+
+    created, message, booking_id = db.create_booking(2, 2, f'{future_day} 10:30:00')
+    assert not created
+    assert booking_id == 0
+    assert message.startswith("Это время уже занято")
+
+    assert db.create_booking(2, 2, f'{future_day} 11:00:00')[0]
+
+
+def test_cancelled_booking_frees_slot(db, future_day):
+    _, _, booking_id = db.create_booking(1, 3, f'{future_day} 10:00:00')
+    db.update_booking_status(booking_id, 'cancelled')
+
+    assert db.create_booking(2, 3, f'{future_day} 10:00:00')[0]
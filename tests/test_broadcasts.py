@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def job_id(db):
+    """Рассылка всем клиентам: у клиентов 1..7 есть записи"""
+    with db.db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO bookings (user_id, service_id, booking_datetime, status) VALUES (?, 2, ?, 'pending')",
+            [(user_id, f'2030-01-{user_id:02d} 10:00:00') for user_id in range(1, 8)]
+        )
+    return db.create_broadcast_job('all', 'Новости салона', admin_chat_id=100)
+
+
+def test_chunks_resume_from_cursor(db, job_id):
+    assert db.get_broadcast_job(job_id)['total_count'] == 7
+
+    first = db.claim_broadcast_chunk(job_id, 3)
+    db.record_broadcast_results(job_id, [(user_id, True) for user_id in first])
+    second = db.claim_broadcast_chunk(job_id, 3)
+    third = db.claim_broadcast_chunk(job_id, 3)
+
+    assert first == [1, 2, 3]
+    assert second == [4, 5, 6]
+    assert third == [7]
+    assert db.claim_broadcast_chunk(job_id, 3) == []
+
+
+def test_interrupted_chunk_is_not_resent_or_counted_twice(db, job_id):
+    db.claim_broadcast_chunk(job_id, 3)
+
+    # Свежий захват может отправлять другой вызов - его не трогаем
+    assert db.abandon_claimed_deliveries(job_id, older_than=600) == 0
+    assert db.abandon_claimed_deliveries(job_id) == 3
+    # Результат пришел после того, как доставку закрыли как прерванную
+    db.record_broadcast_results(job_id, [(1, True), (2, False)])
+
+    job = db.get_broadcast_job(job_id)
+    assert (job['sent_count'], job['failed_count']) == (0, 3)
+    assert db.claim_broadcast_chunk(job_id, 10) == [4, 5, 6, 7]
+
+
+def test_parallel_claims_get_disjoint_recipients(db, job_id):
+    workers = 4
+    barrier = threading.Barrier(workers)
+    claimed = []
+
+    def claim():
+        barrier.wait()
+        claimed.append(db.claim_broadcast_chunk(job_id, 2))
+
+    threads = [threading.Thread(target=claim) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    recipients = [user_id for chunk in claimed for user_id in chunk]
+    assert sorted(recipients) == list(range(1, 8))
+
+
+def test_finished_job_claims_nothing(db, job_id):
+    db.finish_broadcast_job(job_id)
+
+    assert db.claim_broadcast_chunk(job_id, 3) == []
+    assert db.get_running_broadcast_jobs() == []
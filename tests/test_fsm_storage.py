@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from database import fsm_storage
+from database.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Счетчик обращений хранилища к базе за сессией"""
+    calls = []
+    original = fsm_storage.load_fsm_record
+
+    async def counting(*args):
+        calls.append(args)
+        return await original(*args)
+
+    monkeypatch.setattr(fsm_storage, 'load_fsm_record', counting)
+    return calls
+
+
+def test_save_returns_previous_and_new_revision(db):
+    key = 'session'
+    previous, first = db.save_fsm_field(key, 'state', 'Booking:date')
+    assert previous is None and first
+
+    previous, second = db.save_fsm_field(key, 'data', '{"a":1}')
+    assert previous == first and second != first
+
+    revision, unchanged, state, data = db.load_fsm_record(key, 3600, second)
+    assert (revision, unchanged, state, data) == (second, True, None, None)
+
+    revision, unchanged, state, data = db.load_fsm_record(key, 3600, first)
+    assert (revision, unchanged, state, data) == (second, False, 'Booking:date', '{"a":1}')
+
+
+def test_empty_session_is_deleted(db):
+    db.save_fsm_field('session', 'state', 'Booking:date')
+    _, revision = db.save_fsm_field('session', 'state', None)
+
+    assert revision is None
+    assert db.load_fsm_record('session', 3600) is None
+
+
+def test_own_writes_are_read_from_memory(db, loads):
+    async def scenario():
+        storage = SQLiteStorage(check_interval=60)
+        await storage.get_state(KEY)
+        loads.clear()
+
+        await storage.set_state(KEY, 'Booking:service')
+        await storage.set_data(KEY, {'service_id': 2})
+        return await storage.get_state(KEY), await storage.get_data(KEY)
+
+    assert asyncio.run(scenario()) == ('Booking:service', {'service_id': 2})
+    assert loads == []
+
+
+def test_change_from_other_process_is_seen_after_check_interval(db):
+    async def scenario():
+        ours, theirs = SQLiteStorage(check_interval=0), SQLiteStorage(check_interval=0)
+        await ours.set_data(KEY, {'step': 1})
+        assert await ours.get_data(KEY) == {'step': 1}
+
+        await theirs.set_data(KEY, {'step': 2})
+        return await ours.get_data(KEY)
+
+    assert asyncio.run(scenario()) == {'step': 2}
+
+
+def test_write_over_foreign_revision_drops_cached_copy(db):
+    async def scenario():
+        ours, theirs = SQLiteStorage(check_interval=60), SQLiteStorage(check_interval=60)
+        await ours.set_state(KEY, 'Booking:service')
+        await ours.set_data(KEY, {'step': 1})
+        await ours.get_data(KEY)
+
+        # Другой процесс меняет данные, затем мы меняем состояние: прежняя метка
+        # уже не наша, поэтому копия в памяти не должна остаться в ходу
+        await theirs.set_data(KEY, {'step': 2})
+        await ours.set_state(KEY, 'Booking:date')
+        return await ours.get_state(KEY), await ours.get_data(KEY)
+
+    assert asyncio.run(scenario()) == ('Booking:date', {'step': 2})
@@ -0,0 +1,16 @@
+import datetime
+
+
+def test_due_reminders_are_claimed_earliest_first_and_once(db, future_day):
+    for time_str in ('12:00', '11:00', '15:00'):
+        _, _, booking_id = db.create_booking(1, 2, f'{future_day} {time_str}:00')
+        db.update_booking_status(booking_id, 'confirmed')
+
+    now = datetime.datetime.fromisoformat(f'{future_day} 10:30:00')
+
+    first = db.claim_due_reminders(now, limit=1)
+    rest = db.claim_due_reminders(now)
+
+    assert [r['booking_datetime'][11:16] for r in first] == ['11:00']
+    assert [r['booking_datetime'][11:16] for r in rest] == ['12:00']
+    assert db.claim_due_reminders(now) == []
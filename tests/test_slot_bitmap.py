@@ -0,0 +1,68 @@
+import datetime
+import random
+
+from utils.slot_bitmap import DayBitmap, min_start_minute
+
+BUFFER_MINUTES = 30
+
+
+def baseline_free_starts(slots, bookings, service_duration, slot_date, now):
+    """Прежний расчет свободного времени: перебор слотов и множество занятых времен"""
+    busy_slots = set()
+    for booking_datetime, duration in bookings:
+        current = datetime.datetime.strptime(booking_datetime, '%Y-%m-%d %H:%M:%S')
+        for _ in range(-(-duration // 30)):
+            busy_slots.add(current.strftime('%H:%M'))
+            current += datetime.timedelta(minutes=30)
+
+    needed = -(-service_duration // 30)
+    available = []
+    for i in range(len(slots) - needed + 1):
+        if all(slots[i + j][1] and slots[i + j][0] not in busy_slots for j in range(needed)):
+            slot_datetime = datetime.datetime.combine(
+                slot_date, datetime.datetime.strptime(slots[i][0], '%H:%M').time()
+            )
+            if slot_date > now.date() or (
+                slot_date == now.date() and slot_datetime >= now + datetime.timedelta(minutes=BUFFER_MINUTES)
+            ):
+                available.append(slots[i][0])
+    return available
+
+
+def random_day(rng, slot_date):
+    """Слоты дня с закрытыми слотами и записи, в том числе не по сетке слотов"""
+    first = rng.choice([9 * 60, 10 * 60, 11 * 60])
+    count = rng.randint(0, 20)
+    slots = [
+        (f'{(first + 30 * i) // 60:02d}:{(first + 30 * i) % 60:02d}', int(rng.random() > 0.15))
+        for i in range(count)
+    ]
+
+    bookings = []
+    for _ in range(rng.randint(0, 5)):
+        minute = first + rng.choice([30 * rng.randint(0, 20), 15 + 30 * rng.randint(0, 20)])
+        start = datetime.datetime.combine(slot_date, datetime.time()) + datetime.timedelta(minutes=minute)
+        bookings.append((start.strftime('%Y-%m-%d %H:%M:%S'), rng.choice([15, 20, 30, 45, 60, 120, 240])))
+    return slots, bookings
+
+
+def test_bitmap_matches_baseline_on_random_days():
+    rng = random.Random(20240501)
+    today = datetime.date(2030, 3, 10)
+
+    for _ in range(3000):
+        slot_date = today + datetime.timedelta(days=rng.randint(-1, 2))
+        now = datetime.datetime.combine(today, datetime.time()) + datetime.timedelta(
+            seconds=rng.randint(0, 24 * 3600 - 1)
+        )
+        slots, bookings = random_day(rng, slot_date)
+        duration = rng.choice([15, 20, 30, 45, 60, 120, 240])
+
+        day = DayBitmap(slots)
+        bitmap = day.free_starts(
+            day.busy_mask(bookings), duration, min_start_minute(slot_date, now, BUFFER_MINUTES)
+        )
+
+        assert bitmap == baseline_free_starts(slots, bookings, duration, slot_date, now), (
+            slots, bookings, duration, slot_date, now
+        )
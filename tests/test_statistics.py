@@ -0,0 +1,158 @@
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def bookings(db):
+    """Записи нескольких клиентов на разные дни и услуги, с разными статусами"""
+    today = datetime.date.today()
+    for user_id in range(1, 6):
+        db.save_user(user_id, f'client{user_id}', f'Клиент {user_id}')
+
+    plan = [
+        (1, 2, -3, '10:00', 'confirmed'), (2, 3, -3, '12:00', 'cancelled'),
+        (1, 4, 0, '10:00', 'confirmed'), (3, 2, 0, '14:00', 'pending'),
+        (4, 6, 2, '11:00', 'confirmed'), (5, 2, 2, '15:00', 'confirmed'),
+        (2, 8, 5, '10:00', 'pending'), (3, 4, 5, '13:00', 'confirmed'),
+    ]
+    ids = []
+    with db.db_connection() as conn:
+        for user_id, service_id, offset, time_str, status in plan:
+            day = (today + datetime.timedelta(days=offset)).isoformat()
+            cursor = conn.execute(
+                'INSERT INTO bookings (user_id, service_id, booking_datetime, status, price) '
+                'VALUES (?, ?, ?, ?, (SELECT price FROM services WHERE service_id = ?))',
+                (user_id, service_id, f'{day} {time_str}:00', status, service_id)
+            )
+            ids.append(cursor.lastrowid)
+    return ids
+
+
+def test_booking_stores_service_price(db, future_day):
+    _, _, booking_id = db.create_booking(1, 4, f'{future_day} 10:00:00', 'key-1')
+
+    with db.db_connection() as conn:
+        price = conn.execute('SELECT price FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()[0]
+    assert price == db.get_service_by_id(4)['price']
+
+
+def test_counters_match_recount_after_changes(db, bookings):
+    assert db.verify_statistics() == []
+
+    db.update_booking_status(bookings[3], 'confirmed')
+    db.update_booking_status(bookings[0], 'cancelled')
+    with db.db_connection() as conn:
+        conn.execute('DELETE FROM bookings WHERE booking_id = ?', (bookings[6],))
+        conn.execute(
+            "UPDATE bookings SET booking_datetime = datetime(booking_datetime, '+1 day') WHERE booking_id = ?",
+            (bookings[4],)
+        )
+
+    assert db.verify_statistics() == []
+
+
+def test_price_change_does_not_move_revenue(db, bookings):
+    revenue = db.get_statistics()['revenue']
+
+    with db.db_connection() as conn:
+        conn.execute('UPDATE services SET price = price * 3')
+    db.update_booking_status(bookings[2], 'cancelled')
+    db.update_booking_status(bookings[2], 'confirmed')
+
+    assert db.get_statistics()['revenue'] == revenue
+    assert db.verify_statistics() == []
+
+
+def test_statistics_values(db, bookings):
+    stats = db.get_statistics()
+
+    prices = {service_id: db.get_service_by_id(service_id)['price'] for service_id in (2, 4, 6)}
+    assert stats['confirmed'] == 5
+    assert stats['pending'] == 2
+    assert stats['today'] == 1
+    assert stats['revenue'] == prices[2] * 2 + prices[4] * 2 + prices[6]
+    assert stats['unique_clients'] == 5
+    assert stats['total_users'] == 5
+
+
+def test_rebuild_repairs_counters(db, bookings):
+    with db.db_connection() as conn:
+        conn.execute("UPDATE stats_status SET bookings = bookings + 7 WHERE status = 'confirmed'")
+
+    mismatches = db.verify_statistics()
+    assert any(mismatch.startswith('status confirmed') for mismatch in mismatches)
+
+    db.rebuild_statistics()
+    assert db.verify_statistics() == []
+
+
+def expected_rollup(db, day):
+    """Сводка дня, посчитанная прямо по таблице записей"""
+    with db.db_connection() as conn:
+        rows = conn.execute(
+            'SELECT user_id, service_id, status, price FROM bookings WHERE substr(booking_datetime, 1, 10) = ?',
+            (day,)
+        ).fetchall()
+
+    status_counts, services = {}, {}
+    for row in rows:
+        status_counts[row['status']] = status_counts.get(row['status'], 0) + 1
+        service = services.setdefault(
+            db.get_service_by_id(row['service_id'])['name'], {'bookings': 0, 'confirmed': 0, 'revenue': 0}
+        )
+        service['bookings'] += 1
+        if row['status'] == 'confirmed':
+            service['confirmed'] += 1
+            service['revenue'] += row['price']
+
+    return {
+        'date': day,
+        'total_count': len(rows),
+        'status_counts': status_counts,
+        'daily_revenue': sum(service['revenue'] for service in services.values()),
+        'services': services,
+        'unique_clients': len({row['user_id'] for row in rows}),
+    }
+
+
+def test_daily_rollups_match_bookings(db, bookings):
+    db.update_booking_status(bookings[3], 'confirmed')
+    start = datetime.date.today() - datetime.timedelta(days=4)
+
+    rollups = db.get_daily_rollups(start, start + datetime.timedelta(days=10))
+
+    assert len(rollups) == 11
+    for rollup in rollups:
+        assert rollup == expected_rollup(db, rollup['date'])
+
+
+def test_daily_rollups_are_read_only(db, bookings):
+    today = datetime.date.today()
+    with db.db_connection() as conn:
+        changes = conn.total_changes
+        db.get_period_report(today - datetime.timedelta(days=6), 7)
+        assert conn.total_changes == changes
+
+
+def test_period_report_counts_each_client_once(db, bookings):
+    start = datetime.date.today() - datetime.timedelta(days=3)
+
+    report = db.get_period_report(start, 9)
+
+    assert report['unique_clients'] == 5
+    assert report['total_count'] == len(bookings)
+    assert report['revenue'] == sum(day['daily_revenue'] for day in report['days'])
+
+
+def test_verify_statistics_checks_daily_counters(db, bookings):
+    with db.db_connection() as conn:
+        conn.execute('DELETE FROM stats_daily_clients')
+        conn.execute('UPDATE stats_daily_services SET revenue = revenue + 1')
+
+    mismatches = db.verify_statistics()
+    assert any(mismatch.startswith('daily_clients') for mismatch in mismatches)
+    assert any(mismatch.startswith('daily_services') for mismatch in mismatches)
+
+    db.rebuild_statistics()
+    assert db.verify_statistics() == []